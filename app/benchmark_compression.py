@@ -0,0 +1,90 @@
+import argparse
+import logging
+from time import perf_counter
+from similarbooks import create_app
+from similarbooks.config import Config
+from spiders.bookspider.bookspider.models import Book
+from app.similarbooks.main.compression import ENCODINGS
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Measure the size and latency of detailed book responses "
+        "per content encoding.",
+        prog="benchmark_compression",
+    )
+    parser.add_argument(
+        "--books",
+        "-n",
+        help="Number of most rated books requested.",
+        default=100,
+        type=int,
+    )
+    parser.add_argument(
+        "--repeat",
+        "-r",
+        help="Number of requests per book and encoding.",
+        default=5,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)]
+
+
+def benchmark(client, path, shas, accept_encoding, repeat, **kwargs):
+    sizes, latencies = [], []
+    headers = {"X-RapidAPI-Proxy-Secret": Config.SECRET_KEY}
+    if accept_encoding:
+        headers["Accept-Encoding"] = accept_encoding
+    for sha in shas:
+        for _ in range(repeat):
+            t_start = perf_counter()
+            response = path(client, sha, headers)
+            latencies.append(perf_counter() - t_start)
+        sizes.append(len(response.get_data()))
+    return {
+        "KB": sum(sizes) / len(sizes) / 1024,
+        "p50 ms": percentile(latencies, 0.5) * 1000,
+        "p95 ms": percentile(latencies, 0.95) * 1000,
+    }
+
+
+def graphql_path(client, sha, headers):
+    return client.post(
+        "/graphql",
+        json={"id": "detailed_book", "variables": {"filters": {"sha": sha}}},
+        headers=headers,
+    )
+
+
+def page_path(client, sha, headers):
+    return client.get(f"/book/{sha}/", headers=headers)
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    som_app = create_app()
+    shas = [
+        book["sha"]
+        for book in Book.objects(sha__ne=None)
+        .only("sha")
+        .order_by("-ratings_count")
+        .limit(args.books)
+        .as_pymongo()
+    ]
+
+    client = som_app.test_client()
+    for name, path in (("graphql", graphql_path), ("page", page_path)):
+        # The first round fills the query and page caches
+        benchmark(client, path, shas, None, 1)
+        for encoding in (None,) + ENCODINGS:
+            result = benchmark(client, path, shas, encoding, args.repeat)
+            logging.info(
+                f"{name:>7} {encoding or 'identity':>8}: "
+                + ", ".join(f"{key} {value:.2f}" for key, value in result.items())
+            )
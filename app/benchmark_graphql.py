@@ -0,0 +1,94 @@
+import argparse
+import logging
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from similarbooks import create_app
+from app.similarbooks.main.utils import execute_query
+from app.similarbooks.main.constants import (
+    BOOK_QUERY,
+    RANDOM_BOOK_QUERY,
+    DETAILED_BOOK_QUERY,
+)
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Compare in-process and HTTP loopback GraphQL execution. "
+        "The HTTP mode needs the app running on GRAPHQL_ENDPOINT.",
+        prog="benchmark_graphql",
+    )
+    parser.add_argument(
+        "--requests",
+        "-n",
+        help="Number of queries per mode.",
+        default=500,
+        type=int,
+    )
+    parser.add_argument(
+        "--concurrency",
+        "-c",
+        help="Number of concurrent callers.",
+        default=6,
+        type=int,
+    )
+    parser.add_argument(
+        "--sha",
+        help="Book sha used for the detailed book query.",
+        default=None,
+        type=str,
+    )
+    parser.add_argument(
+        "--modes",
+        help="Execution modes to compare.",
+        nargs="+",
+        choices=["in_process", "http"],
+        default=["in_process", "http"],
+    )
+    return parser.parse_args()
+
+
+def benchmark(app, queries, in_process, requests, concurrency):
+    def run(i):
+        # The in-process resolvers need a request context like in a view
+        with app.test_request_context():
+            t_start = perf_counter()
+            query, variables = queries[i % len(queries)]
+            execute_query(query, variables, in_process=in_process)
+            return perf_counter() - t_start
+
+    t_start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(run, range(requests)))
+    elapsed = perf_counter() - t_start
+
+    return {
+        "req/s": requests / elapsed,
+        "p50 ms": latencies[len(latencies) // 2] * 1000,
+        "p95 ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    som_app = create_app()
+
+    queries = [
+        (RANDOM_BOOK_QUERY, {}),
+        (BOOK_QUERY, {"filters": {"title_contains": "the"}}),
+    ]
+    if args.sha:
+        queries.append((DETAILED_BOOK_QUERY, {"filters": {"sha": args.sha}}))
+
+    for mode in args.modes:
+        result = benchmark(
+            som_app,
+            queries,
+            in_process=mode == "in_process",
+            requests=args.requests,
+            concurrency=args.concurrency,
+        )
+        logging.info(
+            f"{mode:>10}: "
+            + ", ".join(f"{key} {value:.1f}" for key, value in result.items())
+        )
@@ -0,0 +1,126 @@
+import argparse
+import logging
+import threading
+import bson
+from collections import UserDict
+from time import perf_counter
+from pymongo import monitoring
+import flask
+
+
+class ReplyBytes(monitoring.CommandListener):
+    """Count the bytes of the aggregation replies Mongo sends."""
+
+    def __init__(self):
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        if event.command_name in ("aggregate", "getMore"):
+            with self._lock:
+                self.bytes += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+# The listener has to be registered before the app creates its client
+reply_bytes = ReplyBytes()
+monitoring.register(reply_bytes)
+
+from similarbooks import create_app
+from app.similarbooks.config import Config
+from spiders.bookspider.bookspider.schema import schema
+from app.similarbooks.main.constants import (
+    BOOK_QUERY,
+    SIMILAR_BOOK_QUERY,
+    DETAILED_BOOK_QUERY,
+)
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Compare all_books with and without projection push-down.",
+        prog="benchmark_projection",
+    )
+    parser.add_argument(
+        "--requests",
+        "-n",
+        help="Number of executions per query and mode.",
+        default=200,
+        type=int,
+    )
+    parser.add_argument(
+        "--title",
+        help="Title searched by the book query.",
+        default="the",
+        type=str,
+    )
+    parser.add_argument(
+        "--sha",
+        help="Book sha used for the detailed and similar book queries.",
+        default=None,
+        type=str,
+    )
+    return parser.parse_args()
+
+
+def benchmark(query, variables, project_fields, requests):
+    reply_bytes.bytes = 0
+    latencies = []
+    # The Config the resolvers read, not the one of the similarbooks package
+    default = Config.GRAPHQL_PROJECT_FIELDS
+    Config.GRAPHQL_PROJECT_FIELDS = project_fields
+    try:
+        for _ in range(requests):
+            t_start = perf_counter()
+            result = schema.execute(
+                query,
+                variable_values=variables,
+                context_value=UserDict(request=flask.request),
+            )
+            latencies.append(perf_counter() - t_start)
+            if result.errors:
+                raise RuntimeError(result.errors)
+    finally:
+        Config.GRAPHQL_PROJECT_FIELDS = default
+
+    latencies.sort()
+    return {
+        "KB/query": reply_bytes.bytes / requests / 1024,
+        "p50 ms": latencies[len(latencies) // 2] * 1000,
+        "p95 ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    som_app = create_app()
+
+    queries = {"book": (BOOK_QUERY, {"filters": {"title_contains": args.title}})}
+    if args.sha:
+        queries["detailed"] = (DETAILED_BOOK_QUERY, {"filters": {"sha": args.sha}})
+        with som_app.test_request_context():
+            book = schema.execute(
+                DETAILED_BOOK_QUERY,
+                variable_values=queries["detailed"][1],
+                context_value=UserDict(request=flask.request),
+            ).data["all_books"]["edges"][0]["node"]
+        queries["similar"] = (
+            SIMILAR_BOOK_QUERY,
+            {"filters": {"bmu_col": book["bmu_col"], "bmu_row": book["bmu_row"]}},
+        )
+
+    with som_app.test_request_context():
+        for name, (query, variables) in queries.items():
+            for project_fields in (False, True):
+                result = benchmark(query, variables, project_fields, args.requests)
+                mode = "projected" if project_fields else "full"
+                logging.info(
+                    f"{name:>8} {mode:>9}: "
+                    + ", ".join(f"{key} {value:.1f}" for key, value in result.items())
+                )
@@ -0,0 +1,110 @@
+import argparse
+import logging
+from collections import UserDict
+from time import perf_counter
+import flask
+from similarbooks import create_app
+from app.similarbooks.config import Config
+from spiders.bookspider.bookspider.schema import schema
+from app.similarbooks.main.constants import BOOK_QUERY, SIMILAR_BOOK_QUERY
+
+# Every field of the book type, the worst case for the per row object churn
+FULL_BOOK_QUERY = """
+query FullBooks {
+  all_books (per_page: 50, order_by: "-ratings_count") {
+    edges {
+      node {
+        book_id, title, author, summary, genres, language, image_url, num_pages,
+        average_rating, ratings_count, text_reviews_count, url, sha, date,
+        bmu_col, bmu_row
+      }
+    }
+  }
+}""".strip()
+
+
+class ResolverTimer:
+    """GraphQL middleware timing the root field resolvers of an execution."""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def resolve(self, next_resolver, root, info, **kwargs):
+        if root is not None:
+            return next_resolver(root, info, **kwargs)
+        t_start = perf_counter()
+        try:
+            return next_resolver(root, info, **kwargs)
+        finally:
+            self.seconds += perf_counter() - t_start
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Compare all_books pages resolved to Book objects and to raw dicts.",
+        prog="benchmark_raw_nodes",
+    )
+    parser.add_argument(
+        "--requests",
+        "-n",
+        help="Number of executions per query and mode.",
+        default=200,
+        type=int,
+    )
+    parser.add_argument(
+        "--title",
+        help="Title searched by the book query.",
+        default="the",
+        type=str,
+    )
+    return parser.parse_args()
+
+
+def benchmark(query, variables, raw_nodes, requests):
+    timer = ResolverTimer()
+    latencies = []
+    # The Config the resolvers read, not the one of the similarbooks package
+    default = Config.GRAPHQL_RAW_NODES
+    Config.GRAPHQL_RAW_NODES = raw_nodes
+    try:
+        for _ in range(requests):
+            t_start = perf_counter()
+            result = schema.execute(
+                query,
+                variable_values=variables,
+                context_value=UserDict(request=flask.request),
+                middleware=[timer],
+            )
+            latencies.append(perf_counter() - t_start)
+            if result.errors:
+                raise RuntimeError(result.errors)
+    finally:
+        Config.GRAPHQL_RAW_NODES = default
+
+    latencies.sort()
+    return {
+        "resolver ms": timer.seconds / requests * 1000,
+        "p50 ms": latencies[len(latencies) // 2] * 1000,
+        "p95 ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    som_app = create_app()
+
+    queries = {
+        "book": (BOOK_QUERY, {"filters": {"title_contains": args.title}}),
+        "similar": (SIMILAR_BOOK_QUERY, {}),
+        "full": (FULL_BOOK_QUERY, {}),
+    }
+    with som_app.test_request_context():
+        for name, (query, variables) in queries.items():
+            for raw_nodes in (False, True):
+                result = benchmark(query, variables, raw_nodes, args.requests)
+                mode = "raw" if raw_nodes else "objects"
+                logging.info(
+                    f"{name:>8} {mode:>7}: "
+                    + ", ".join(f"{key} {value:.2f}" for key, value in result.items())
+                )
@@ -0,0 +1,210 @@
+import sys
+import argparse
+import logging
+import threading
+from collections import UserDict
+from pymongo import monitoring
+import flask
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Record the read commands the app sends to Mongo."""
+
+    def __init__(self):
+        self.commands = []
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name in ("aggregate", "find"):
+            with self._lock:
+                self.commands.append(
+                    (event.database_name, event.command_name, dict(event.command))
+                )
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+# The listener has to be registered before the app creates its client
+recorder = CommandRecorder()
+monitoring.register(recorder)
+
+from similarbooks import create_app
+from spiders.bookspider.bookspider.models import Book, Websom
+from spiders.bookspider.bookspider.similar import similar_books
+from spiders.bookspider.bookspider.indexes import (
+    plan_problems,
+    verify_indexes,
+)
+from app.similarbooks.main.persisted import execute_document
+from app.similarbooks.main.constants import (
+    BOOK_QUERY,
+    RANDOM_BOOK_QUERY,
+    DETAILED_BOOK_QUERY,
+    SIMILAR_BOOK_QUERY,
+)
+
+# Keys the driver adds to a command that explain does not accept
+SESSION_KEYS = ("lsid", "$db", "$clusterTime", "$readPreference", "txnNumber")
+
+TOP_BOOKS_QUERY = """
+query TopBooks($after: String) {
+  all_books (first: 50, order_by: "-ratings_count", after: $after) {
+    edges { node { sha, title } }
+    pageInfo { endCursor }
+  }
+}""".strip()
+
+LANGUAGE_QUERY = """
+query LanguageBooks($filters: BookFilter) {
+  all_books (first: 50, filters: $filters) {
+    edges { node { sha, title } }
+  }
+}""".strip()
+
+
+def run_query(query, variables=None):
+    result = execute_document(
+        query,
+        variables,
+        context_value=UserDict(request=flask.request),
+    )
+    if result.errors:
+        raise RuntimeError(result.errors)
+    return result.data
+
+
+def query_shapes(book):
+    """Return the query shapes of the app as (name, run, allowed problems).
+
+    A text search cannot be sorted by an index and $sample scans collections
+    that are small compared to the sample, so those are allowed there.
+    """
+    cell = {"bmu_col": book["bmu_col"], "bmu_row": book["bmu_row"]}
+    word = max(book["title"].split(), key=len)
+
+    def next_top_page():
+        page = run_query(TOP_BOOKS_QUERY)["all_books"]
+        run_query(TOP_BOOKS_QUERY, {"after": page["pageInfo"]["endCursor"]})
+
+    return [
+        (
+            "book",
+            lambda: run_query(BOOK_QUERY, {"filters": {"title_contains": word}}),
+            {"SORT"},
+        ),
+        (
+            "detailed_book",
+            lambda: run_query(DETAILED_BOOK_QUERY, {"filters": {"sha": book["sha"]}}),
+            set(),
+        ),
+        (
+            "similar_book",
+            lambda: run_query(SIMILAR_BOOK_QUERY, {"filters": cell}),
+            set(),
+        ),
+        ("random_book", lambda: run_query(RANDOM_BOOK_QUERY), {"COLLSCAN", "SORT"}),
+        ("top_books", next_top_page, set()),
+        (
+            "language_books",
+            lambda: run_query(
+                LANGUAGE_QUERY,
+                {
+                    "filters": {
+                        "language": book["language"],
+                        "spider": book["spider"],
+                        "summary_length_gte": 200,
+                    }
+                },
+            ),
+            set(),
+        ),
+        (
+            "pipeline_book_id",
+            lambda: Book.objects(book_id=book["book_id"]).first(),
+            set(),
+        ),
+        # The few books of a cell are ranked in memory
+        ("similar_books", lambda: similar_books(book["sha"]), {"SORT"}),
+    ]
+
+
+def explain(database_name, command):
+    command = {key: value for key, value in command.items() if key not in SESSION_KEYS}
+    database = Book._get_db().client[database_name]
+    return database.command(
+        {"explain": command, "verbosity": "queryPlanner"},
+    )
+
+
+def check_indexes(create):
+    missing = verify_indexes(Book, Websom)
+    if not any(
+        index.get("weights")
+        for index in Book._get_collection().index_information().values()
+    ):
+        logging.warning("Book has no text index, title_contains will fail")
+
+    if missing and create:
+        logging.info(f"Building {missing} missing indexes")
+        Book.ensure_indexes()
+        Websom.ensure_indexes()
+        missing = 0
+    return missing
+
+
+def check_plans():
+    book = (
+        Book.objects(sha__ne=None, bmu_col__ne=None, title__ne=None)
+        .only("sha", "book_id", "title", "bmu_col", "bmu_row", "language", "spider")
+        .as_pymongo()
+        .first()
+    )
+    if book is None:
+        logging.error("No book with a SOM cell to build the query shapes from")
+        return 1
+
+    flagged = 0
+    for name, run, allowed in query_shapes(book):
+        recorder.commands = []
+        run()
+        for database_name, command_name, command in recorder.commands:
+            # Shapes also read lda_websom, so the collection is logged too
+            collection = command[command_name]
+            problems = plan_problems(explain(database_name, command))
+            unexpected = problems - allowed
+            flagged += bool(unexpected)
+            log = logging.warning if unexpected else logging.info
+            log(
+                f"{name:>16} {command_name} on {collection}: "
+                + (", ".join(sorted(problems)) or "index only")
+            )
+    return flagged
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Check the declared indexes of the live collections and "
+        "explain the query shapes of the app. Exits with 1 when an index is "
+        "missing or a query scans the collection or sorts in memory.",
+        prog="check_indexes",
+    )
+    parser.add_argument(
+        "--create",
+        help="Build the missing indexes before explaining the queries.",
+        action="store_true",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    som_app = create_app()
+    with som_app.test_request_context():
+        missing = check_indexes(args.create)
+        flagged = check_plans()
+    sys.exit(1 if missing or flagged else 0)
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import random
+import hashlib
+import argparse
+import logging
+import subprocess
+import datetime
+import requests
+from pathlib import Path
+from time import sleep, perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient, TEXT
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+PARENT_DIR = Path(__file__).resolve().parent
+ROOT_DIR = PARENT_DIR.parent
+WORDS = [
+    "the", "dark", "river", "house", "of", "night", "secret", "garden", "lost",
+    "city", "winter", "queen", "last", "song", "fire", "stone", "silent", "sea",
+    "harry", "shadow", "king", "road", "little", "women", "war", "peace",
+]  # fmt: skip
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Compare gunicorn worker configurations against a local Mongo.",
+        prog="load_test",
+    )
+    parser.add_argument(
+        "--profile",
+        help="JSON load profile with the configurations to compare.",
+        default=PARENT_DIR / "load_profile.json",
+        type=Path,
+    )
+    parser.add_argument(
+        "--configurations",
+        help="Names of the profile configurations to run, all by default.",
+        nargs="+",
+        default=None,
+    )
+    parser.add_argument(
+        "--skip_seed",
+        help="Use the books already in the Mongo of the profile.",
+        action="store_true",
+    )
+    return parser.parse_args()
+
+
+def seed_books(mongo_uri, n_books, grid=10):
+    """Replace the books and SOM cells of the stand-in database with n_books random books."""
+    client = MongoClient(mongo_uri)
+    db = client.get_default_database()
+    db.book.drop()
+    db.lda_websom.drop()
+
+    rng = random.Random(0)
+    books, cells = [], {}
+    for i in range(n_books):
+        sha = hashlib.sha1(str(i).encode()).hexdigest()
+        bmu_col, bmu_row = rng.randrange(grid), rng.randrange(grid)
+        books.append(
+            {
+                "book_id": str(i),
+                "title": " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+                "author": f"Author {rng.randrange(n_books // 4 + 1)}",
+                "summary": " ".join(rng.choices(WORDS, k=rng.randint(20, 120))),
+                "image_url": f"https://example.com/{sha}.jpg",
+                "language": "English",
+                "ratings_count": int(rng.paretovariate(1.2) * 10),
+                "average_rating": round(rng.uniform(1, 5), 2),
+                "sha": sha,
+                "spider": "goodreads",
+                "date": datetime.datetime(2024, 1, 1),
+                "bmu_col": bmu_col,
+                "bmu_row": bmu_row,
+            }
+        )
+        cells.setdefault((bmu_col, bmu_row), []).append(sha)
+
+    db.book.insert_many(books)
+    db.book.create_index([("title", TEXT)])
+    db.lda_websom.insert_many(
+        [
+            {"bmu_col": bmu_col, "bmu_row": bmu_row, "matched_list": shas}
+            for (bmu_col, bmu_row), shas in cells.items()
+        ]
+    )
+    logging.info(f"Seeded {n_books} books into {len(cells)} cells")
+    return [book["sha"] for book in books]
+
+
+def start_server(configuration, port, mongo_uri):
+    command = [
+        sys.executable,
+        str(PARENT_DIR / "wsgi.py"),
+        "--bind",
+        f"127.0.0.1:{port}",
+    ]
+    for option in [
+        "worker_class",
+        "workers",
+        "threads",
+        "timeout",
+        "max_requests",
+        "max_requests_jitter",
+    ]:
+        if option in configuration:
+            command += [f"--{option}", str(configuration[option])]
+    if configuration.get("preload"):
+        command.append("--preload")
+
+    env = dict(
+        os.environ,
+        MONGODB_SIMILARBOOKS_URI=mongo_uri,
+        PYTHONPATH=os.pathsep.join(
+            filter(None, [str(ROOT_DIR), os.environ.get("PYTHONPATH")])
+        ),
+        # Every configuration starts with a cold cache
+        CACHE_DIR=f"/tmp/similarbooks-load-test-{configuration['name']}",
+        CACHE_SHARED_TYPE="SimpleCache",
+    )
+    server = subprocess.Popen(command, env=env, cwd=PARENT_DIR)
+
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(120):
+        try:
+            if requests.get(f"{url}/ping", timeout=1).ok:
+                return server, url
+        except requests.ConnectionError:
+            pass
+        sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"Server for {configuration['name']} did not start")
+
+
+def run_load(url, paths, shas, n_requests, concurrency):
+    rng = random.Random(1)
+    targets = [
+        url + rng.choice(paths).format(sha=rng.choice(shas)) for _ in range(n_requests)
+    ]
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def fetch(target):
+        t_start = perf_counter()
+        try:
+            ok = session.get(target, timeout=30).ok
+        except requests.RequestException:
+            ok = False
+        return perf_counter() - t_start, ok
+
+    t_start = perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, targets))
+    elapsed = perf_counter() - t_start
+
+    latencies = sorted(latency for latency, _ in results)
+    return {
+        "req/s": n_requests / elapsed,
+        "p50 ms": latencies[len(latencies) // 2] * 1000,
+        "p95 ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "errors": sum(not ok for _, ok in results),
+    }
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    profile = json.loads(args.profile.read_text())
+    mongo_uri = profile["mongo_uri"]
+
+    if args.skip_seed:
+        db = MongoClient(mongo_uri).get_default_database()
+        shas = [book["sha"] for book in db.book.find({}, {"sha": 1}).limit(10_000)]
+    else:
+        shas = seed_books(mongo_uri, profile["seed_books"])
+
+    configurations = [
+        configuration
+        for configuration in profile["configurations"]
+        if args.configurations is None or configuration["name"] in args.configurations
+    ]
+    results = {}
+    for configuration in configurations:
+        server, url = start_server(configuration, profile["port"], mongo_uri)
+        try:
+            # Let the workers load their in-memory indexes before measuring
+            run_load(url, profile["paths"], shas, profile["warmup_requests"], 4)
+            results[configuration["name"]] = run_load(
+                url,
+                profile["paths"],
+                shas,
+                profile["requests"],
+                profile["concurrency"],
+            )
+        finally:
+            server.terminate()
+            server.wait()
+        logging.info(
+            f"{configuration['name']:>14}: "
+            + ", ".join(
+                f"{key} {value:.1f}"
+                for key, value in results[configuration["name"]].items()
+            )
+        )
+
+    print(json.dumps(results, indent=2))
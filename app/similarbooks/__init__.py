@@ -1,7 +1,10 @@
-import graphene
 from functools import wraps
 from pathlib import Path
-from app.similarbooks.main.common import cache
+from app.similarbooks.main.common import cache, metrics
+from app.similarbooks.main.utils import model_version
+from app.similarbooks.main.covers import cover_urls
+from app.similarbooks.main.compression import compress_response
+from app.similarbooks.main.export import parse_filters, parse_fields, export_books
 from similarbooks.config import Config
 from app.similarbooks.main.constants import DEBUG
 from flask import (
@@ -11,11 +14,15 @@ from flask import (
     render_template,
     send_from_directory,
     redirect,
+    stream_with_context,
 )
-from graphql_server.flask import GraphQLView
 from collections import UserDict
 from flask_mongoengine import MongoEngine
-from spiders.bookspider.bookspider.schema import Book, Query
+from spiders.bookspider.bookspider.schema import schema
+from app.similarbooks.main.persisted import (
+    PersistedQueryView,
+    register_persisted_queries,
+)
 
 db = MongoEngine()
 
@@ -41,13 +48,12 @@ def token_required(f):
 
 
 def graphql_view():
-    schema = graphene.Schema(query=Query, types=[Book], auto_camelcase=False)
     # NOTE: This can be used for exporting the schema into a json file
     # import json
     # introspection_dict = schema.introspect()
     # with open('/tmp/schema.json', 'w') as fp:
     #     json.dump(introspection_dict, fp)
-    view = GraphQLView.as_view(
+    view = PersistedQueryView.as_view(
         "graphql", schema=schema, graphiql=DEBUG, context=UserDict()
     )
     return token_required(view) if not DEBUG else view
@@ -66,22 +72,55 @@ def create_app(config_class=Config):
 
     # Register the custom filter with the Flask application
     app.jinja_env.filters["extract_year"] = extract_year
+    app.jinja_env.globals["cover_urls"] = cover_urls
 
     cache.init_app(
         app=app,
-        config={"CACHE_TYPE": "filesystem", "CACHE_DIR": Path("/tmp/similarbooks")},
+        config={
+            "CACHE_TYPE": "app.similarbooks.main.cache_backends.TieredCache",
+            "CACHE_SHARED_TYPE": Config.CACHE_SHARED_TYPE,
+            "CACHE_DIR": Path(Config.CACHE_DIR),
+            "CACHE_REDIS_URL": Config.CACHE_REDIS_URL,
+            "CACHE_MEMCACHED_SERVERS": Config.CACHE_MEMCACHED_SERVERS,
+            "CACHE_LOCAL_MAX_BYTES": Config.CACHE_LOCAL_MAX_BYTES,
+            "CACHE_LOCAL_TIMEOUT": Config.CACHE_LOCAL_TIMEOUT,
+            "CACHE_THRESHOLD": Config.CACHE_THRESHOLD,
+            # Entries of older deployments are never read again and expire
+            "CACHE_KEY_PREFIX": f"{Config.VERSION}:",
+        },
     )
-
-    with app.app_context():
-        cache.clear()
+    app.config["MODEL_VERSION"] = model_version()
+    register_persisted_queries()
 
     db.init_app(app)
+    app.after_request(compress_response)
 
     app.add_url_rule(
         "/graphql",
         view_func=graphql_view(),
     )
 
+    # Counters of the worker serving the request
+    @app.route("/stats")
+    @token_required
+    def serve_stats():
+        return jsonify({"cache": cache.cache.stats(), "metrics": metrics.snapshot()})
+
+    # Books matching the BookFilter JSON in ?filters= as one JSON object per line,
+    # ?fields= limits them to a comma separated list of fields
+    @app.route("/export/books.ndjson")
+    @token_required
+    def export_books_ndjson():
+        try:
+            match = parse_filters(request.args.get("filters"))
+            fields = parse_fields(request.args.get("fields"))
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        return app.response_class(
+            stream_with_context(export_books(match, fields)),
+            mimetype="application/x-ndjson",
+        )
+
     @app.errorhandler(404)
     def page_not_found(error):
         return render_template("not_found.html"), 404
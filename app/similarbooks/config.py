@@ -1,20 +1,71 @@
 import os
+from pathlib import Path
 
 
 class Config:
     VERSION_MAJOR = 1
     VERSION_MINOR = 1
     VERSION_PATCH = 0
+    VERSION = f"v{VERSION_MAJOR}.{VERSION_MINOR}.{VERSION_PATCH}"
     SECRET_KEY = os.environ.get("API_SECRET_KEY")
     EVAL_API_SECRET_KEY = os.environ.get("EVAL_API_SECRET_KEY")
     MONGODB_DB = "similarbooks"
     MONGODB_SIMILARBOOKS_URL = os.environ.get("MONGODB_SIMILARBOOKS_URL")
     MONGODB_SIMILARBOOKS_USER = os.environ.get("MONGODB_SIMILARBOOKS_USER")
     MONGODB_SIMILARBOOKS_PWD = os.environ.get("MONGODB_SIMILARBOOKS_PWD")
-    MONGO_URI = f"mongodb://{MONGODB_SIMILARBOOKS_USER}:{MONGODB_SIMILARBOOKS_PWD}@{MONGODB_SIMILARBOOKS_URL}:27017/{MONGODB_DB}?authMechanism=DEFAULT&authSource={MONGODB_DB}&tls=true&tlsCAFile=%2Fetc%2Fssl%2Fmongodb%2Fmongodb.crt&tlsCertificateKeyFile=%2Fetc%2Fssl%2Fmongodb%2Fmongodb.pem"
+    # MONGODB_SIMILARBOOKS_URI replaces the production URI, e.g. with a local
+    # Mongo for load tests
+    MONGO_URI = os.environ.get(
+        "MONGODB_SIMILARBOOKS_URI",
+        f"mongodb://{MONGODB_SIMILARBOOKS_USER}:{MONGODB_SIMILARBOOKS_PWD}@{MONGODB_SIMILARBOOKS_URL}:27017/{MONGODB_DB}?authMechanism=DEFAULT&authSource={MONGODB_DB}&tls=true&tlsCAFile=%2Fetc%2Fssl%2Fmongodb%2Fmongodb.crt&tlsCertificateKeyFile=%2Fetc%2Fssl%2Fmongodb%2Fmongodb.pem",
+    )
     MONGODB_SETTINGS = {
         "host": MONGO_URI,
     }
+    # Execute the GraphQL queries of the views inside the worker instead of
+    # posting them to GRAPHQL_ENDPOINT (which blocks a second worker)
+    GRAPHQL_IN_PROCESS = os.environ.get("GRAPHQL_IN_PROCESS", "true").lower() == "true"
+    # Serialize the book rows as plain dicts instead of building a Book object
+    # per row, see app/benchmark_raw_nodes.py
+    GRAPHQL_RAW_NODES = os.environ.get("GRAPHQL_RAW_NODES", "false").lower() == "true"
+    # Read only the fields a query selects instead of whole book documents,
+    # see app/benchmark_projection.py
+    GRAPHQL_PROJECT_FIELDS = (
+        os.environ.get("GRAPHQL_PROJECT_FIELDS", "true").lower() == "true"
+    )
+    # Shared cache tier behind the per-worker LRU, e.g. RedisCache with
+    # CACHE_REDIS_URL or MemcachedCache with CACHE_MEMCACHED_SERVERS
+    CACHE_SHARED_TYPE = os.environ.get("CACHE_SHARED_TYPE", "FileSystemCache")
+    CACHE_DIR = os.environ.get("CACHE_DIR", "/tmp/similarbooks")
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL")
+    CACHE_MEMCACHED_SERVERS = os.environ.get("CACHE_MEMCACHED_SERVERS", "").split(",")
+    CACHE_LOCAL_MAX_BYTES = int(
+        os.environ.get("CACHE_LOCAL_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    CACHE_LOCAL_TIMEOUT = 60
+    CACHE_THRESHOLD = int(os.environ.get("CACHE_THRESHOLD", 100_000))
+    # Number of most rated book pages pre-rendered before serving, 0 disables it
+    WARM_CACHE_TOP_N = int(os.environ.get("WARM_CACHE_TOP_N", 0))
+    # Cache-Control max-age of book pages for browsers, proxies and CDNs
+    BOOK_PAGE_MAX_AGE = int(os.environ.get("BOOK_PAGE_MAX_AGE", 60 * 60))
+    # Model pickles of som/utils.py and the model version of the cache keys
+    MODELS_DIR = Path(
+        os.environ.get(
+            "SIMILARBOOKS_MODELS_DIR",
+            Path(__file__).resolve().parents[2] / "som" / "models",
+        )
+    )
+    # Load the LDA and SOM models of similar_to_text when a worker starts
+    # instead of on the first request
+    PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "false").lower() == "true"
+    # Downloaded PNG covers, the WebP derivatives and their manifest live
+    # in COVERS_DIR / "webp"
+    COVERS_DIR = Path(
+        os.environ.get(
+            "SIMILARBOOKS_COVERS_DIR",
+            Path(__file__).resolve().parent / "static" / "covers",
+        )
+    )
     SENDER_NAME = "similarbooks Support"
     MAIL_USERNAME = "support@findsimilarbooks.com"
     MAIL_PASSWORD = os.environ.get("MAIL_PASSWORD")
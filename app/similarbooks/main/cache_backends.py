@@ -0,0 +1,162 @@
+import pickle
+import threading
+from time import time
+from collections import OrderedDict, Counter
+from flask_caching.backends.base import BaseCache
+from werkzeug.utils import import_string
+
+
+class TieredCache(BaseCache):
+    """Per-worker LRU bounded by bytes in front of a cache shared by all workers.
+
+    Values are kept pickled in the local tier, so its size can be accounted
+    exactly and callers never share mutable objects. Local entries live at most
+    `local_timeout` seconds, which bounds how long a worker can serve a value
+    that another worker deleted or replaced in the shared tier.
+    """
+
+    def __init__(
+        self,
+        shared,
+        max_bytes=64 * 1024 * 1024,
+        local_timeout=60,
+        key_prefix="",
+        default_timeout=300,
+    ):
+        super().__init__(default_timeout=default_timeout)
+        self.shared = shared
+        self.max_bytes = max_bytes
+        self.local_timeout = local_timeout
+        self.key_prefix = key_prefix or ""
+        self._local = OrderedDict()  # key -> (expires, data)
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        shared_type = config.get("CACHE_SHARED_TYPE", "FileSystemCache")
+        if "." not in shared_type:
+            shared_type = "flask_caching.backends." + shared_type
+        # The key prefix is applied once by this class for both tiers
+        shared_config = dict(config, CACHE_KEY_PREFIX=None)
+        shared = import_string(shared_type).factory(
+            app, shared_config, list(args), dict(kwargs)
+        )
+        return cls(
+            shared,
+            max_bytes=config.get("CACHE_LOCAL_MAX_BYTES", 64 * 1024 * 1024),
+            local_timeout=config.get("CACHE_LOCAL_TIMEOUT", 60),
+            key_prefix=config.get("CACHE_KEY_PREFIX"),
+            **kwargs,
+        )
+
+    def _normalize_timeout(self, timeout):
+        if timeout is None:
+            timeout = self.default_timeout
+        return timeout
+
+    def _local_expires(self, timeout):
+        # A timeout of 0 never expires in the shared tier, locally it is capped
+        timeout = self._normalize_timeout(timeout)
+        if timeout == 0 or timeout > self.local_timeout:
+            timeout = self.local_timeout
+        return time() + timeout
+
+    def _remove_local(self, key):
+        entry = self._local.pop(key, None)
+        if entry is not None:
+            self._local_bytes -= len(key) + len(entry[1])
+
+    def _set_local(self, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        size = len(key) + len(data)
+        with self._lock:
+            self._remove_local(key)
+            if size > self.max_bytes:
+                return
+            self._local[key] = (self._local_expires(timeout), data)
+            self._local_bytes += size
+            while self._local_bytes > self.max_bytes:
+                evicted_key, (_, evicted_data) = self._local.popitem(last=False)
+                self._local_bytes -= len(evicted_key) + len(evicted_data)
+                self._stats["evictions"] += 1
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time():
+                self._remove_local(key)
+                return None
+            self._local.move_to_end(key)
+            self._stats["local_hits"] += 1
+            data = entry[1]
+        return pickle.loads(data)
+
+    def get(self, key):
+        key = self.key_prefix + key
+        value = self._get_local(key)
+        if value is not None:
+            return value
+
+        value = self.shared.get(key)
+        if value is None:
+            self._count("misses")
+            return None
+        self._count("shared_hits")
+        self._set_local(key, value, self.local_timeout)
+        return value
+
+    def set(self, key, value, timeout=None):
+        key = self.key_prefix + key
+        timeout = self._normalize_timeout(timeout)
+        result = self.shared.set(key, value, timeout=timeout)
+        self._set_local(key, value, timeout)
+        return result
+
+    def add(self, key, value, timeout=None):
+        key = self.key_prefix + key
+        timeout = self._normalize_timeout(timeout)
+        added = self.shared.add(key, value, timeout=timeout)
+        if added:
+            self._set_local(key, value, timeout)
+        return added
+
+    def delete(self, key):
+        key = self.key_prefix + key
+        with self._lock:
+            self._remove_local(key)
+        return self.shared.delete(key)
+
+    def has(self, key):
+        key = self.key_prefix + key
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None and entry[0] >= time():
+                return True
+        return self.shared.has(key)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+            self._local_bytes = 0
+        return self.shared.clear()
+
+    def stats(self):
+        """Return the counters of this worker's cache tier."""
+        with self._lock:
+            return {
+                "local_hits": self._stats["local_hits"],
+                "shared_hits": self._stats["shared_hits"],
+                "misses": self._stats["misses"],
+                "evictions": self._stats["evictions"],
+                "local_entries": len(self._local),
+                "local_bytes": self._local_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -1,4 +1,6 @@
 import logging
+import threading
+from collections import Counter
 from flask_caching import Cache
 from app.similarbooks.main.constants import DEBUG
 
@@ -9,3 +11,22 @@ logging.basicConfig(
 
 # Instantiate the cache
 cache = Cache()
+
+
+class Metrics:
+    """Thread safe counters of the current worker, reported by /stats."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
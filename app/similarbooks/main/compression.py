@@ -0,0 +1,130 @@
+import gzip
+import zlib
+from flask import current_app, request
+from werkzeug.wsgi import ClosingIterator
+from app.similarbooks.main.common import metrics
+from app.similarbooks.main.constants import (
+    COMPRESSIBLE_MIMETYPES,
+    COMPRESSION_MIN_SIZE,
+    GZIP_LEVEL,
+    BROTLI_QUALITY,
+)
+
+try:
+    import brotli
+except ImportError:
+    # Brotli is optional, without it every client gets gzip
+    brotli = None
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate():
+    """Return the preferred encoding the client accepts, None for identity."""
+    accepted = [
+        (request.accept_encodings[encoding], encoding)
+        for encoding in ENCODINGS
+        if request.accept_encodings[encoding]
+    ]
+    if not accepted:
+        return None
+    # Ties keep the order of ENCODINGS, brotli compresses better
+    return max(accepted, key=lambda quality_encoding: quality_encoding[0])[1]
+
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def stream_compressed(chunks, encoding):
+    """Compress an iterable of chunks, flushing after each one.
+
+    Every chunk is sent as soon as it is produced, which keeps streamed
+    responses streaming at a small cost in ratio.
+    """
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.process(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+    else:
+        # wbits 31 writes the gzip header and trailer
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+
+
+def precompress(page):
+    """Encode a rendered page for the cache in every supported encoding."""
+    data = page.encode("utf-8") if isinstance(page, str) else page
+    return {encoding: compress(data, encoding) for encoding in ENCODINGS}
+
+
+def precompressed_response(variants, mimetype="text/html"):
+    """Serve a cache entry of precompress without compressing again."""
+    encoding = negotiate()
+    if encoding is None:
+        # Rare enough to decompress on the fly instead of caching it as well
+        response = current_app.response_class(
+            gzip.decompress(variants["gzip"]), mimetype=mimetype
+        )
+    else:
+        response = current_app.response_class(variants[encoding], mimetype=mimetype)
+        response.headers["Content-Encoding"] = encoding
+        metrics.incr(f"compression.precompressed_{encoding}")
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response):
+    """after_request hook compressing text responses for clients accepting it.
+
+    Buffered bodies below COMPRESSION_MIN_SIZE are left alone, streamed bodies
+    are compressed chunk by chunk. Files, partial and already encoded
+    responses are passed through.
+    """
+    if (
+        response.mimetype not in COMPRESSIBLE_MIMETYPES
+        or response.direct_passthrough
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = negotiate()
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        chunks = response.response
+        # Closing the response still closes the iterable it streams from
+        response.response = ClosingIterator(
+            stream_compressed(chunks, encoding), getattr(chunks, "close", None)
+        )
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESSION_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+        metrics.incr("compression.bytes_in", len(data))
+        metrics.incr("compression.bytes_out", response.content_length)
+
+    response.headers["Content-Encoding"] = encoding
+    # The encoded body is a different representation of the same resource
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -4,11 +4,76 @@ QUERY_LIMIT = 50 if not DEBUG else 10_000_000
 
 # NOTE: The endpoint and cookie session needs to be adjusted on the server
 GRAPHQL_ENDPOINT = "http://127.0.0.1:8000/graphql"
+EXPORT_ENDPOINT = "http://127.0.0.1:8000/export/books.ndjson"
+
+# Books per Mongo cursor batch and per streamed chunk of the NDJSON export
+EXPORT_BATCH_SIZE = 1000
 
 GUTENBERG_PREFIX = "gb_"
 
 MIN_SUMMARY_LENGTH = 400
 
+# Pool of eligible books the landing page draws its random books from
+RANDOM_BOOKS_COUNT = 10
+RANDOM_POOL_SIZE = 2000
+RANDOM_POOL_REFRESH_SECONDS = 10 * 60
+RANDOM_POOL_MIN_SUMMARY_LENGTH = MIN_SUMMARY_LENGTH
+RANDOM_POOL_OVERSAMPLING = 3
+RANDOM_POOL_FIELDS = (
+    "sha",
+    "book_id",
+    "title",
+    "author",
+    "image_url",
+    "ratings_count",
+    "date",
+)
+
+# Most rated titles kept in the in-memory typeahead index of each worker
+TITLE_INDEX_SIZE = 200_000
+SUGGEST_LIMIT = 10
+
+# Number of books materialized into the similar list of a SOM cell
+SIMILAR_LIST_SIZE = 50
+
+# Bulk lookups by sha: shas per $in query, queries run at once per worker,
+# their time limit and the most shas books_by_sha takes in one request
+BULK_BATCH_SIZE = 500
+BULK_WORKERS = 4
+BULK_TIME_LIMIT_MS = 5000
+BULK_MAX_SHAS = 5000
+
+# Texts mapped onto the SOM by similar_to_text: characters kept, texts per
+# LDA batch and how long a batch waits for more, the time budget in seconds
+# of a request and how long results are cached by text hash
+TEXT_MAX_LENGTH = 20_000
+TEXT_BATCH_SIZE = 32
+TEXT_BATCH_WINDOW_MS = 10
+TEXT_INFERENCE_TIMEOUT = 2.0
+TEXT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Widths in px of the WebP cover derivatives, their quality and how long
+# browsers keep them (the filenames change with the content)
+COVER_WIDTHS = [64, 128, 200]
+COVER_QUALITY = 80
+COVER_MAX_AGE = 365 * 24 * 60 * 60
+
+# Responses of these types are compressed from COMPRESSION_MIN_SIZE bytes on,
+# smaller ones do not fill a packet anyway
+COMPRESSIBLE_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/plain",
+    "text/xml",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+}
+COMPRESSION_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
 IGNORE_FIELDS_FOR_FILTER = [
     "model",
     "document",
@@ -17,41 +82,51 @@ IGNORE_FIELDS_FOR_FILTER = [
     "order_by",
     "filters",
     "rapid_api_request",
+    "fields",
+    "raw",
+    # Pagination arguments of the connection
+    "first",
+    "after",
+    "last",
+    "before",
 ]
 
+# The queries of the views take their filters as the $filters variable and are
+# registered as persisted queries at startup
 BOOK_QUERY = """
-{{
-  all_books (per_page: 50, order_by: "-ratings_count",  filters: {0} ) {{
-    edges {{
-      node {{
+query Books($filters: BookFilter) {
+  all_books (per_page: 50, order_by: "-ratings_count", filters: $filters) {
+    edges {
+      node {
         sha,
         title,
         author,
         ratings_count,
-      }}
-    }}
-  }}
-}}""".strip()
+      }
+    }
+  }
+}""".strip()
 
 RANDOM_BOOK_QUERY = """
-{{
-  random_books (order_by: "-ratings_count") {{
-    edges {{
-      node {{
+query RandomBooks {
+  random_books (order_by: "-ratings_count") {
+    edges {
+      node {
         sha,
         title,
         author,
-      }}
-    }}
-  }}
-}}""".strip()
+      }
+    }
+  }
+}""".strip()
 
 DETAILED_BOOK_QUERY = """
-{{
-  all_books (filters: {0} ) {{
-    edges {{
-      node {{
+query DetailedBook($filters: BookFilter) {
+  all_books (filters: $filters) {
+    edges {
+      node {
         sha,
+        date,
         spider,
         summary,
         title,
@@ -61,21 +136,64 @@ DETAILED_BOOK_QUERY = """
         bmu_row,
         amazon_link,
         kindle_link,
-      }}
-    }}
-  }}
-}}""".strip()
+      }
+    }
+  }
+}""".strip()
 
 SIMILAR_BOOK_QUERY = """
-{{
-  all_books (per_page: 50, order_by: "-ratings_count",  filters: {0} ) {{
-    edges {{
-      node {{
+query SimilarBooks($filters: BookFilter) {
+  all_books (per_page: 50, order_by: "-ratings_count", filters: $filters) {
+    edges {
+      node {
         sha,
         title,
         author,
         ratings_count,
-      }}
-    }}
-  }}
-}}""".strip()
+      }
+    }
+  }
+}""".strip()
+
+# Persisted queries by name, clients may also address them by their sha256
+PERSISTED_QUERIES = {
+    "book": BOOK_QUERY,
+    "random_book": RANDOM_BOOK_QUERY,
+    "detailed_book": DETAILED_BOOK_QUERY,
+    "similar_book": SIMILAR_BOOK_QUERY,
+}
+
+# Number of parsed and validated GraphQL documents kept per worker
+DOCUMENT_CACHE_SIZE = 512
+
+# Time limits of the totalCount and facets of all_books, their results are
+# cached per filter. Facets list the FACET_LIMIT most frequent values
+COUNT_TIME_LIMIT_MS = 500
+FACET_TIME_LIMIT_MS = 2000
+COUNT_CACHE_TIMEOUT = 10 * 60
+FACET_FIELDS = ["language", "spider", "genres"]
+FACET_LIMIT = 20
+
+# Query cost of the RapidAPI requests: a book row costs QUERY_ROW_COST, times
+# a factor when the filters cannot use an index of Book.meta
+MAX_QUERY_DEPTH = 10
+MAX_QUERY_COST = 100
+QUERY_ROW_COST = 0.1
+QUERY_TEXT_FACTOR = 3
+QUERY_SCAN_FACTOR = 10
+QUERY_COUNT_COST = 2
+QUERY_FACET_COST = 5
+QUERY_TEXT_INFERENCE_COST = 10
+# Filters on a field of an index of Book.meta use it with these operators
+INDEXED_OPERATORS = ("", "_in", "_gt", "_gte", "_lt", "_lte")
+TEXT_FILTERS = {"title_contains"}
+INDEXED_ORDERS = {None, "ratings_count", "-ratings_count"}
+
+# Token buckets of the RapidAPI users in query cost per second and burst, by
+# the plan in the X-RapidAPI-Subscription header
+RATE_LIMITS = {
+    "BASIC": (5, 100),
+    "PRO": (20, 400),
+    "ULTRA": (50, 1000),
+    "MEGA": (100, 2000),
+}
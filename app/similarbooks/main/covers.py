@@ -0,0 +1,66 @@
+import logging
+import threading
+from time import time
+from flask import url_for
+from app.similarbooks.config import Config
+from spiders.bookspider.bookspider.covers import read_manifest
+
+
+class CoverManifest:
+    """Lookup of the WebP cover derivatives written by the spider and
+    som/write_cover_derivatives.py.
+
+    The manifest is re-read when its modification time changed, checked at most
+    every `reload_seconds`, so new covers show up without a restart.
+    """
+
+    def __init__(self, manifest_path, reload_seconds=60):
+        self.manifest_path = manifest_path
+        self.reload_seconds = reload_seconds
+        self._entries = {}
+        self._mtime = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+
+    def _reload(self):
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            self._entries = read_manifest(self.manifest_path)
+            self._mtime = mtime
+        except OSError as e:
+            logging.error(f"Reading the cover manifest failed: {e}")
+
+    def get(self, sha):
+        if time() - self._checked_at > self.reload_seconds:
+            with self._lock:
+                if time() - self._checked_at > self.reload_seconds:
+                    self._reload()
+                    self._checked_at = time()
+        return self._entries.get(sha)
+
+
+cover_manifest = CoverManifest(Config.COVERS_DIR / "webp" / "manifest.jsonl")
+
+
+def cover_urls(sha):
+    """Return src and srcset of a cover, the PNG without a srcset if no derivatives exist."""
+    entry = cover_manifest.get(sha)
+    if entry is None:
+        return {"src": url_for("static", filename=f"covers/{sha}.png"), "srcset": None}
+
+    urls = [
+        (
+            url_for("main.serve_cover", filename=f"{sha}.{entry['hash']}.{width}.webp"),
+            width,
+        )
+        for width in entry["widths"]
+    ]
+    return {
+        "src": urls[-1][0],
+        "srcset": ", ".join(f"{url} {width}w" for url, width in urls),
+    }
@@ -0,0 +1,69 @@
+import json
+import datetime
+from graphql import GraphQLError, coerce_input_value
+from app.similarbooks.main.common import metrics
+from app.similarbooks.main.constants import EXPORT_BATCH_SIZE
+from spiders.bookspider.bookspider.models import Book as BookModel
+from spiders.bookspider.bookspider.schema import schema, book_match
+
+
+def parse_filters(filters):
+    """Return the $match of a JSON object of BookFilter filters.
+
+    The filters use the names of the GraphQL arguments, e.g.
+    {"language": "English", "summary_length_gte": 400}. Raises ValueError
+    for malformed or unknown filters.
+    """
+    if not filters:
+        return {}
+    try:
+        value = coerce_input_value(
+            json.loads(filters), schema.graphql_schema.get_type("BookFilter")
+        )
+    except (json.JSONDecodeError, GraphQLError) as e:
+        raise ValueError(f"Invalid filters: {e}") from e
+    return book_match(dict(value))
+
+
+def parse_fields(fields):
+    """Return the projected book fields of a comma separated list, None for all."""
+    if not fields:
+        return None
+    fields = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in BookModel._fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def export_books(match, fields=None, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the books of match as NDJSON, one chunk per cursor batch.
+
+    Only one batch of books is held at a time. Each chunk is compressed and
+    flushed on its own by compress_response, so they are kept batch sized.
+    """
+    projection = {"_id": 0}
+    if fields is not None:
+        projection = {field: 1 for field in fields if field != "id"}
+        projection["_id"] = 0
+    cursor = BookModel._get_collection().find(match, projection, batch_size=batch_size)
+    lines = []
+    try:
+        for book in cursor:
+            lines.append(json.dumps(book, default=_default, ensure_ascii=False))
+            if len(lines) == batch_size:
+                metrics.incr("export.books", len(lines))
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if lines:
+            metrics.incr("export.books", len(lines))
+            yield "\n".join(lines) + "\n"
+    finally:
+        # A client that disconnects early closes the generator
+        cursor.close()
@@ -12,6 +12,7 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired, NumberRange, Length
 from wtforms.widgets import TextArea
+from app.similarbooks.main.constants import TEXT_MAX_LENGTH
 
 
 class LandingSearchForm(FlaskForm):
@@ -21,3 +22,15 @@ class LandingSearchForm(FlaskForm):
         render_kw={"placeholder": "Enter a title to search for books"},
     )
     submit = SubmitField("Search")
+
+
+class TextSearchForm(FlaskForm):
+    text = TextAreaField(
+        "Text",
+        validators=[DataRequired(), Length(min=20, max=TEXT_MAX_LENGTH)],
+        render_kw={
+            "placeholder": "Describe a book or paste a summary to find similar books",
+            "rows": 8,
+        },
+    )
+    submit = SubmitField("Find similar books")
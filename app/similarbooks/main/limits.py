@@ -0,0 +1,182 @@
+import math
+from time import time
+from graphql import FieldNode, FragmentSpreadNode, InlineFragmentNode
+from graphql.language import FragmentDefinitionNode
+from graphql.utilities import get_operation_ast, value_from_ast_untyped
+from app.similarbooks.main.common import cache
+from app.similarbooks.main.constants import (
+    QUERY_LIMIT,
+    QUERY_ROW_COST,
+    QUERY_TEXT_FACTOR,
+    QUERY_SCAN_FACTOR,
+    QUERY_COUNT_COST,
+    QUERY_FACET_COST,
+    QUERY_TEXT_INFERENCE_COST,
+    BULK_BATCH_SIZE,
+    BULK_MAX_SHAS,
+    INDEXED_OPERATORS,
+    TEXT_FILTERS,
+    INDEXED_ORDERS,
+    RATE_LIMITS,
+)
+from spiders.bookspider.bookspider.models import Book
+from spiders.bookspider.bookspider.indexes import declared_indexes
+
+INDEXED_FIELDS = {field for keys in declared_indexes(Book) for field, _ in keys}
+
+
+def _fields(selection_set, fragments):
+    """Yield the fields of a selection set with its fragments expanded."""
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            yield selection
+        elif isinstance(selection, InlineFragmentNode):
+            yield from _fields(selection.selection_set, fragments)
+        elif isinstance(selection, FragmentSpreadNode):
+            fragment = fragments.get(selection.name.value)
+            if fragment is not None:
+                yield from _fields(fragment.selection_set, fragments)
+
+
+def _fragments(document):
+    return {
+        definition.name.value: definition
+        for definition in document.definitions
+        if isinstance(definition, FragmentDefinitionNode)
+    }
+
+
+def query_depth(document, operation_name=None):
+    """Return the deepest field nesting of an operation of a validated document."""
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+    fragments = _fragments(document)
+
+    def depth(selection_set):
+        return max(
+            (
+                1 + (depth(field.selection_set) if field.selection_set else 0)
+                for field in _fields(selection_set, fragments)
+            ),
+            default=0,
+        )
+
+    return depth(operation.selection_set)
+
+
+def is_indexed_filter(key):
+    """Whether a filter reads an index of Book.meta, like summary_length_gte."""
+    return any(
+        key.endswith(operator) and key[: len(key) - len(operator)] in INDEXED_FIELDS
+        for operator in INDEXED_OPERATORS
+    )
+
+
+def filter_factor(filters, order_by):
+    """Cost factor of reading the rows of the filters in the order_by order."""
+    if not isinstance(filters, dict):
+        filters = {}
+    keys = {key for key, value in filters.items() if value is not None}
+    if any(is_indexed_filter(key) for key in keys):
+        return 1
+    if keys & TEXT_FILTERS:
+        return QUERY_TEXT_FACTOR
+    if not keys and order_by in INDEXED_ORDERS:
+        return 1
+    # Filters without an index read the whole collection
+    return QUERY_SCAN_FACTOR
+
+
+def field_cost(name, arguments, selected):
+    if name == "all_books":
+        rows = arguments.get("first") or arguments.get("per_page")
+        # Variables are coerced after this estimate, invalid ones fail there
+        if not isinstance(rows, int) or not 0 < rows < QUERY_LIMIT:
+            rows = QUERY_LIMIT
+        factor = filter_factor(arguments.get("filters"), arguments.get("order_by"))
+        cost = 1 + rows * QUERY_ROW_COST
+        # Counts read every matching book unless they are cached
+        if "totalCount" in selected:
+            cost += QUERY_COUNT_COST
+        if "facets" in selected:
+            cost += QUERY_FACET_COST
+        return cost * factor
+    if name == "books_by_sha":
+        shas = arguments.get("shas")
+        rows = len(shas) if isinstance(shas, list) else BULK_MAX_SHAS
+        # Every $in batch reads from the sha index like a page of all_books
+        return math.ceil(rows / BULK_BATCH_SIZE) * (1 + QUERY_LIMIT * QUERY_ROW_COST)
+    if name == "similar_to_text":
+        # The LDA inference costs CPU of the worker instead of Mongo work
+        return QUERY_TEXT_INFERENCE_COST
+    # random_books, node and similar_books read the memory, an _id or the
+    # materialized cell lists
+    return 1
+
+
+def query_cost(document, variables=None, operation_name=None):
+    """Estimate the Mongo work of an operation of a validated document.
+
+    Only the root fields query Mongo, their arguments (with the variables
+    filled in) decide how many rows are read and whether an index is used.
+    """
+    operation = get_operation_ast(document, operation_name)
+    if operation is None:
+        return 0
+    fragments = _fragments(document)
+    cost = 0
+    for field in _fields(operation.selection_set, fragments):
+        arguments = {
+            argument.name.value: value_from_ast_untyped(argument.value, variables)
+            for argument in field.arguments
+        }
+        selected = (
+            {child.name.value for child in _fields(field.selection_set, fragments)}
+            if field.selection_set
+            else set()
+        )
+        cost += field_cost(field.name.value, arguments, selected)
+    return math.ceil(cost)
+
+
+class TokenBucketLimiter:
+    """Token buckets in the shared cache tier, so all workers draw from them.
+
+    The bucket is read and written without a lock, concurrent requests of the
+    same user in different workers may both spend the same tokens. That lets a
+    user exceed the limit by a request per worker, which is fine for shedding
+    heavy clients and avoids a round-trip for a lock.
+    """
+
+    def __init__(self, limits=RATE_LIMITS, default_plan="BASIC"):
+        self.limits = limits
+        self.default_plan = default_plan
+
+    @property
+    def store(self):
+        # The per-worker tier of the TieredCache would hide other workers' spending
+        return cache.cache.shared
+
+    def take(self, user, cost, plan=None):
+        """Spend cost tokens of a user, return the seconds to wait if too few."""
+        rate, burst = self.limits.get(plan, self.limits[self.default_plan])
+        key = f"rate:{user}"
+        now = time()
+        bucket = self.store.get(key)
+        if bucket is None:
+            tokens = burst
+        else:
+            tokens = min(burst, bucket["tokens"] + (now - bucket["at"]) * rate)
+        if tokens < cost:
+            return math.ceil((cost - tokens) / rate)
+        # A full bucket is the same as none, so the entry expires once refilled
+        self.store.set(
+            key,
+            {"tokens": tokens - cost, "at": now},
+            timeout=math.ceil(burst / rate) + 1,
+        )
+        return 0
+
+
+rate_limiter = TokenBucketLimiter()
@@ -0,0 +1,204 @@
+import hashlib
+import threading
+from functools import partial
+from collections import OrderedDict
+from flask import Response, request
+from graphql import ExecutionResult, GraphQLError, execute, parse, validate
+from graphql_server import (
+    HttpQueryError,
+    encode_execution_results,
+    get_graphql_params,
+)
+from graphql_server.flask import GraphQLView
+from app.similarbooks.main.common import metrics
+from app.similarbooks.main.constants import (
+    DOCUMENT_CACHE_SIZE,
+    PERSISTED_QUERIES,
+    MAX_QUERY_DEPTH,
+    MAX_QUERY_COST,
+)
+from app.similarbooks.main.limits import query_cost, query_depth, rate_limiter
+from spiders.bookspider.bookspider.schema import schema
+
+
+class DocumentCache:
+    """LRU of parsed and validated GraphQL documents keyed by their text.
+
+    Documents with syntax or validation errors are cached with their errors,
+    so a client repeating an invalid query does not cost a parse either.
+    """
+
+    def __init__(self, graphql_schema, maxsize=DOCUMENT_CACHE_SIZE):
+        self.graphql_schema = graphql_schema
+        self.maxsize = maxsize
+        self._documents = OrderedDict()  # query -> (document, errors)
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        with self._lock:
+            entry = self._documents.get(query)
+            if entry is not None:
+                self._documents.move_to_end(query)
+        if entry is not None:
+            metrics.incr("document_cache.hits")
+            return entry
+
+        metrics.incr("document_cache.misses")
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            entry = (None, [e])
+        else:
+            entry = (document, validate(self.graphql_schema, document))
+
+        with self._lock:
+            self._documents[query] = entry
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+        return entry
+
+
+class PersistedQueries:
+    """Registry of known query documents addressed by name or sha256 hash."""
+
+    def __init__(self):
+        self._queries = {}
+        self._ids = {}
+
+    def register(self, name, query):
+        query_id = hashlib.sha256(query.encode("utf-8")).hexdigest()
+        self._queries[name] = query
+        self._queries[query_id] = query
+        self._ids[query] = query_id
+        return query_id
+
+    def get(self, query_id):
+        return self._queries.get(query_id)
+
+    def id_of(self, query):
+        """Return the hash of a registered query, None for unknown ones."""
+        return self._ids.get(query)
+
+
+document_cache = DocumentCache(schema.graphql_schema)
+persisted_queries = PersistedQueries()
+
+
+def register_persisted_queries(queries=PERSISTED_QUERIES):
+    """Register the queries of the views and parse them before the first request."""
+    for name, query in queries.items():
+        persisted_queries.register(name, query)
+        _, errors = document_cache.get(query)
+        if errors:
+            raise ValueError(f"Persisted query {name} is invalid: {errors}")
+
+
+def execute_document(
+    query, variables=None, operation_name=None, context_value=None, root_value=None
+):
+    """Execute a query against the schema with a cached parse and validation."""
+    document, errors = document_cache.get(query)
+    if errors:
+        return ExecutionResult(data=None, errors=errors)
+    return execute(
+        schema.graphql_schema,
+        document,
+        root_value=root_value,
+        context_value=context_value,
+        variable_values=variables,
+        operation_name=operation_name,
+    )
+
+
+class PersistedQueryView(GraphQLView):
+    """GraphQLView that accepts persisted query ids and caches parsed documents.
+
+    A request may send `id` (a registered name or sha256 hash) or Apollo's
+    `extensions.persistedQuery.sha256Hash` plus `variables` instead of the
+    query text. GraphiQL and batches are left to GraphQLView.
+
+    Requests of RapidAPI users are limited in depth and cost and spend their
+    cost from the token bucket of the user, an empty bucket answers 429.
+    """
+
+    def check_limits(self, query, variables, operation_name):
+        user = request.headers.get("X-RapidAPI-User")
+        if user is None:
+            # Requests of the site itself
+            return
+        document, errors = document_cache.get(query)
+        if errors:
+            return
+        if query_depth(document, operation_name) > MAX_QUERY_DEPTH:
+            metrics.incr("limits.too_deep")
+            raise HttpQueryError(400, f"Query is deeper than {MAX_QUERY_DEPTH}.")
+        cost = query_cost(document, variables, operation_name)
+        if cost > MAX_QUERY_COST:
+            metrics.incr("limits.too_costly")
+            raise HttpQueryError(
+                400, f"Query cost {cost} is above the limit of {MAX_QUERY_COST}."
+            )
+        retry_after = rate_limiter.take(
+            user, cost, request.headers.get("X-RapidAPI-Subscription")
+        )
+        if retry_after:
+            metrics.incr("limits.rate_limited")
+            raise HttpQueryError(
+                429,
+                "Rate limit exceeded.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    def dispatch_request(self):
+        if (
+            request.method.lower() not in ("get", "post")
+            or self.should_display_graphiql()
+        ):
+            return super().dispatch_request()
+
+        try:
+            data = self.parse_body()
+            if isinstance(data, list):
+                return super().dispatch_request()
+
+            params = get_graphql_params(data, request.args)
+            query = params.query
+            if not query:
+                query_id = (
+                    data.get("id")
+                    or request.args.get("id")
+                    or (data.get("extensions") or {})
+                    .get("persistedQuery", {})
+                    .get("sha256Hash")
+                )
+                if not query_id:
+                    raise HttpQueryError(400, "Must provide query string or id.")
+                query = persisted_queries.get(query_id)
+                if query is None:
+                    raise HttpQueryError(404, "PersistedQueryNotFound")
+
+            self.check_limits(query, params.variables, params.operation_name)
+            result = execute_document(
+                query,
+                variables=params.variables,
+                operation_name=params.operation_name,
+                context_value=self.get_context(),
+                root_value=self.get_root_value(),
+            )
+            body, status_code = encode_execution_results(
+                [result],
+                format_error=self.format_error,
+                encode=partial(
+                    self.encode, pretty=self.pretty or request.args.get("pretty")
+                ),
+            )
+            return Response(body, status=status_code, content_type="application/json")
+
+        except HttpQueryError as e:
+            parsed_error = GraphQLError(e.message)
+            return Response(
+                self.encode(dict(errors=[self.format_error(parsed_error)])),
+                status=e.status_code,
+                headers=e.headers,
+                content_type="application/json",
+            )
@@ -14,24 +14,36 @@ from flask import (
     url_for,
     redirect,
     jsonify,
+    current_app,
+    send_from_directory,
 )
+from werkzeug.http import is_resource_modified
 from similarbooks.main.forms import (
     LandingSearchForm,
+    TextSearchForm,
 )
 from similarbooks.main.constants import (
     BOOK_QUERY,
     RANDOM_BOOK_QUERY,
     DETAILED_BOOK_QUERY,
-    SIMILAR_BOOK_QUERY,
     MIN_SUMMARY_LENGTH,
+    SIMILAR_LIST_SIZE,
+    SUGGEST_LIMIT,
+    COVER_MAX_AGE,
 )
 from similarbooks.config import Config
 from similarbooks.main.utils import (
     query_data,
     extract_and_add_params,
+    book_validators,
 )
+from app.similarbooks.main.suggest import title_index
+from app.similarbooks.main.covers import cover_urls
+from app.similarbooks.main.compression import precompress, precompressed_response
+from app.similarbooks.main.text_inference import similar_to_text, InferenceTimeout
+from spiders.bookspider.bookspider.similar import book_similar_books
 
-VERSION = f"v{Config.VERSION_MAJOR}.{Config.VERSION_MINOR}.{Config.VERSION_PATCH}"
+VERSION = Config.VERSION
 
 DAY_IN_SECONDS = 24 * 60 * 60
 
@@ -43,35 +55,6 @@ def ping():
     return {"message": "alive"}
 
 
-def extract_distinct_books(books, ignore_title=None):
-    # Dictionary to store unique titles with the highest ratings_count
-    unique_books = {}
-
-    # Iterate through the list
-    for book in books:
-        title = book["node"]["title"]
-        ratings_count = book["node"]["ratings_count"]
-
-        if title is None or title == ignore_title:
-            continue
-
-        title = title.strip()
-
-        # Add to unique_books if title is not in dictionary yet
-        if title not in unique_books:
-            unique_books[title] = book
-        # If ratings_count is not None, compare and update if higher
-        elif ratings_count is not None:
-            existing_ratings = unique_books[title]["node"]["ratings_count"]
-            # Update if the existing ratings_count is None or current ratings_count is higher
-            if existing_ratings is None or ratings_count > existing_ratings:
-                unique_books[title] = book
-
-    # Convert the result back to a list
-    result = list(unique_books.values())
-    return result
-
-
 @main.route("/home", methods=["POST", "GET"])
 @main.route("/", methods=["POST", "GET"])
 def index():
@@ -96,45 +79,106 @@ def index():
     )
 
 
+@main.route("/similar-to-text", methods=["POST", "GET"])
+def text_search():
+    text_form = TextSearchForm()
+    books = []
+    searched = False
+    if text_form.validate_on_submit():
+        searched = True
+        try:
+            books = [
+                {"node": book}
+                for book in similar_to_text(text_form.text.data, k=SIMILAR_LIST_SIZE)
+            ]
+        except InferenceTimeout:
+            flash("Finding similar books took too long, please try again.", "warning")
+    return render_template(
+        "text_search.html",
+        searched=searched,
+        books=books,
+        text_form=text_form,
+        title="Similar to Text",
+    )
+
+
+def set_validators(response, etag, last_modified):
+    # An encoded body is another representation, its ETag can only be weak
+    response.set_etag(etag, weak="Content-Encoding" in response.headers)
+    response.last_modified = last_modified
+    response.cache_control.public = True
+    response.cache_control.max_age = Config.BOOK_PAGE_MAX_AGE
+    return response
+
+
+@main.route("/api/suggest")
+def suggest():
+    return jsonify(
+        {"suggestions": title_index.suggest(request.args.get("q"), k=SUGGEST_LIMIT)}
+    )
+
+
 @main.route("/book/<sha>/")
-@cache.cached(timeout=60)
 def detailed_book(sha):
     book = query_data(
         DETAILED_BOOK_QUERY,
         {"sha": sha},
+        model_dependent=True,
     )
     if len(book) > 0:
         book = book[0]  # Unlist the book
-        image_file = url_for("static", filename=f"covers/{sha}.png")
-        similar_books = (
-            query_data(
-                SIMILAR_BOOK_QUERY,
-                {
-                    "bmu_col": book["node"].get("bmu_col"),
-                    "bmu_row": book["node"].get("bmu_row"),
-                },
-            )
-            if book["node"].get("bmu_col") is not None
-            else []
-        )
-        unique_similar_books = extract_distinct_books(
-            similar_books, ignore_title=book["node"].get("title")
-        )
-        kindle_link = extract_and_add_params(book["node"].get("kindle_link"))
-        amazon_link = extract_and_add_params(book["node"].get("amazon_link"))
-        return render_template(
-            "detailed.html",
-            book=book,
-            amazon_link=amazon_link,
-            kindle_link=kindle_link,
-            similar_books=unique_similar_books,
-            description=book.get("node").get("summary"),
-            image_file=image_file,
-            title=f"{book.get('node').get('title')} by {book.get('node').get('author')}",
+        etag, last_modified = book_validators(
+            book["node"], current_app.config["MODEL_VERSION"]
         )
+        if not is_resource_modified(
+            request.environ, etag=etag, last_modified=last_modified
+        ):
+            return set_validators(
+                current_app.response_class(status=304), etag, last_modified
+            )
+
+        # The ETag covers everything the page depends on, so it keys the page.
+        # Pages are cached compressed, a hit is served without compressing
+        page_key = f"view/book/encoded/{etag}"
+        variants = cache.get(page_key)
+        if variants is None:
+            variants = precompress(render_detailed_book(sha, book))
+            cache.set(page_key, variants, timeout=DAY_IN_SECONDS)
+        return set_validators(precompressed_response(variants), etag, last_modified)
     return render_template("not_found.html")
 
 
+def render_detailed_book(sha, book):
+    # The page query already holds the SOM cell, the book is not read again
+    unique_similar_books = [
+        {"node": similar_book}
+        for similar_book in book_similar_books(book["node"], k=SIMILAR_LIST_SIZE)
+    ]
+    kindle_link = extract_and_add_params(book["node"].get("kindle_link"))
+    amazon_link = extract_and_add_params(book["node"].get("amazon_link"))
+    return render_template(
+        "detailed.html",
+        book=book,
+        amazon_link=amazon_link,
+        kindle_link=kindle_link,
+        similar_books=unique_similar_books,
+        description=book.get("node").get("summary"),
+        cover=cover_urls(sha),
+        title=f"{book.get('node').get('title')} by {book.get('node').get('author')}",
+    )
+
+
+@main.route("/covers/<filename>")
+def serve_cover(filename):
+    # The filenames carry a hash of the content, so a URL never changes content
+    response = send_from_directory(
+        Config.COVERS_DIR / "webp", filename, max_age=COVER_MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
 @main.route("/about")
 @cache.cached(timeout=60)
 def about():
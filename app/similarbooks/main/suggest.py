@@ -0,0 +1,132 @@
+import os
+import re
+import heapq
+import bisect
+import logging
+import threading
+import unicodedata
+from time import perf_counter
+from app.similarbooks.main.constants import TITLE_INDEX_SIZE, SUGGEST_LIMIT
+from spiders.bookspider.bookspider.models import Book
+
+
+def normalize_title(title):
+    """Lowercase ASCII words separated by single spaces."""
+    title = unicodedata.normalize("NFKD", title).encode("ascii", "ignore").decode()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", title.lower()).split())
+
+
+class TitleIndex:
+    """Sorted normalized titles of the most rated books for prefix lookups.
+
+    Each normalized title is kept once, for its most rated book. A prefix maps
+    to a contiguous range of the sorted keys found by bisection. The `top_n`
+    books of very short prefixes, whose ranges span large parts of the index,
+    are precomputed. Longer prefixes rank their whole, much smaller, range.
+    """
+
+    SHORT_PREFIX_LENGTH = 2
+
+    def __init__(self, size=TITLE_INDEX_SIZE, top_n=SUGGEST_LIMIT):
+        self.size = size
+        self.top_n = top_n
+        self.ready = False
+        self._keys = []
+        self._books = []
+        self._top = {}
+        self._loader_pid = None
+        self._lock = threading.Lock()
+
+    def build(self, books):
+        """Build the index from dicts of sha, title, author and ratings_count."""
+        entries = {}
+        for book in books:
+            key = normalize_title(book.get("title") or "")
+            ratings_count = book.get("ratings_count") or 0
+            if key and (key not in entries or entries[key][0] < ratings_count):
+                entries[key] = (
+                    ratings_count,
+                    {
+                        "sha": book["sha"],
+                        "title": book["title"].strip(),
+                        "author": book.get("author"),
+                        "ratings_count": book.get("ratings_count"),
+                    },
+                )
+
+        keys = sorted(entries)
+        short_prefixes = {}
+        for key in keys:
+            for length in range(1, self.SHORT_PREFIX_LENGTH + 1):
+                short_prefixes.setdefault(key[:length], []).append(entries[key])
+        top = {
+            prefix: [
+                book
+                for _, book in heapq.nlargest(
+                    self.top_n, candidates, key=lambda entry: entry[0]
+                )
+            ]
+            for prefix, candidates in short_prefixes.items()
+        }
+
+        with self._lock:
+            self._keys = keys
+            self._books = [entries[key] for key in keys]
+            self._top = top
+            self.ready = True
+
+    def load(self):
+        t1_start = perf_counter()
+        books = (
+            Book.objects(title__ne=None, sha__ne=None)
+            .only("sha", "title", "author", "ratings_count")
+            .order_by("-ratings_count")
+            .limit(self.size)
+            .as_pymongo()
+        )
+        self.build(books)
+        logging.info(
+            f"Indexed {len(self._keys)} titles in {(perf_counter() - t1_start):.2f} seconds"
+        )
+
+    def _load_safely(self):
+        try:
+            self.load()
+        except Exception as e:
+            logging.error(f"Loading the title index failed: {e}")
+            with self._lock:
+                self._loader_pid = None
+
+    def ensure_loaded(self):
+        """Start loading the index in the background once per process."""
+        if self.ready:
+            return
+        with self._lock:
+            if self._loader_pid == os.getpid():
+                return
+            self._loader_pid = os.getpid()
+        threading.Thread(target=self._load_safely, daemon=True).start()
+
+    def suggest(self, query, k=10):
+        """Return up to k most rated books whose title starts with query."""
+        self.ensure_loaded()
+        prefix = normalize_title(query or "")
+        if not prefix or not self.ready:
+            return []
+
+        if len(prefix) <= self.SHORT_PREFIX_LENGTH and k <= self.top_n:
+            return self._top.get(prefix, [])[:k]
+
+        keys, books = self._keys, self._books
+        start = bisect.bisect_left(keys, prefix)
+        # Normalized keys are ASCII, so every key with the prefix sorts below
+        end = bisect.bisect_left(keys, prefix + "\x7f", lo=start)
+        return [
+            book
+            for _, book in heapq.nlargest(
+                k, books[start:end], key=lambda entry: entry[0]
+            )
+        ]
+
+
+title_index = TitleIndex()
@@ -0,0 +1,148 @@
+import queue
+import hashlib
+import logging
+import threading
+from time import perf_counter, time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import flask
+from app.similarbooks.main.common import cache, metrics
+from app.similarbooks.main.constants import (
+    SIMILAR_LIST_SIZE,
+    TEXT_MAX_LENGTH,
+    TEXT_BATCH_SIZE,
+    TEXT_BATCH_WINDOW_MS,
+    TEXT_INFERENCE_TIMEOUT,
+    TEXT_CACHE_TIMEOUT,
+)
+from spiders.bookspider.bookspider.similar import cell_similar_books
+
+
+class InferenceTimeout(Exception):
+    pass
+
+
+class TextInference:
+    """Map texts to SOM cells in micro-batches on a background thread.
+
+    Callers queue their text and wait for a future. The thread takes what
+    arrives within `window` seconds (at most `max_batch` texts) and runs the
+    vectorizer, LDA and BMU search once for the whole batch, the same steps
+    som/update_model_db.py runs for new books. The models are loaded by the
+    thread on its first batch unless preload was called.
+    """
+
+    MODELS = ("vectorizer", "lda", "lda_websom")
+
+    def __init__(
+        self,
+        max_batch=TEXT_BATCH_SIZE,
+        window=TEXT_BATCH_WINDOW_MS / 1000,
+    ):
+        self.max_batch = max_batch
+        self.window = window
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Started on first use, so it runs in the worker and not in a preloading master
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def infer(self, text, timeout=TEXT_INFERENCE_TIMEOUT):
+        """Return the (bmu_col, bmu_row) of a text, waiting at most timeout seconds."""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # A batch that has not started yet skips the text
+            future.cancel()
+            raise InferenceTimeout(f"Inference took longer than {timeout} seconds")
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return [
+            (text, future)
+            for text, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            t_start = perf_counter()
+            try:
+                cells = self.predict([text for text, _ in batch])
+            except Exception as e:
+                logging.error(f"Text inference failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), cell in zip(batch, cells):
+                future.set_result(cell)
+            metrics.incr("text_inference.batches")
+            metrics.incr("text_inference.texts", len(batch))
+            logging.debug(
+                f"Inferred {len(batch)} texts in {perf_counter() - t_start:.2f} seconds"
+            )
+
+    def preload(self):
+        """Load the models of the inference, return the registry holding them."""
+        # Imported here, som.utils pulls in the scientific stack
+        from som.utils import model_registry
+
+        for name, seconds in model_registry.preload(self.MODELS).items():
+            metrics.incr(f"models.{name}.load_ms", round(seconds * 1000))
+        return model_registry
+
+    def predict(self, texts):
+        from som.utils import get_surface_state
+
+        model_registry = self.preload()
+        tasks_vectorized = model_registry["vectorizer"].transform(texts)
+        tasks_topic_dist = model_registry["lda"].transform(tasks_vectorized)
+        activation_maps = get_surface_state(data=tasks_topic_dist)
+        bmu_nodes = model_registry["lda_websom"].get_bmus(activation_maps)
+        return [(int(bmu_node[0]), int(bmu_node[1])) for bmu_node in bmu_nodes]
+
+
+text_inference = TextInference()
+
+
+def similar_to_text(text, k=SIMILAR_LIST_SIZE):
+    """Return up to k books of the SOM cell a text maps to and its neighbours.
+
+    The result is cached by the hash of the text for the current model.
+    Raises InferenceTimeout if the text could not be mapped in time.
+    """
+    text = " ".join(text.split())[:TEXT_MAX_LENGTH]
+    if not text:
+        return []
+    text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+    key = f"text:{flask.current_app.config['MODEL_VERSION']}:{text_hash}"
+
+    books = cache.get(key)
+    if books is None:
+        metrics.incr("text_inference.misses")
+        bmu_col, bmu_row = text_inference.infer(text)
+        books = cell_similar_books(bmu_col, bmu_row, k=SIMILAR_LIST_SIZE)
+        cache.set(key, books, timeout=TEXT_CACHE_TIMEOUT)
+    else:
+        metrics.incr("text_inference.hits")
+    return books[:k]
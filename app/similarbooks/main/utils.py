@@ -5,17 +5,23 @@ import datetime
 import requests
 import pickle
 import json
-from time import perf_counter
+from collections import UserDict
+from types import SimpleNamespace
+import threading
+from time import perf_counter, time, sleep
 from urllib.parse import urlparse
 from urllib.parse import parse_qs
 import logging
 import hashlib
 import pymongo
+from pathlib import Path
 from app.similarbooks.config import Config
-from app.similarbooks.main.common import cache
+from app.similarbooks.main.common import cache, metrics
+from app.similarbooks.main.singleflight import SingleFlight
 from app.similarbooks.main.constants import (
     GRAPHQL_ENDPOINT,
 )
+from app.similarbooks.main.persisted import execute_document, persisted_queries
 
 average_name_dict = {
     "kaufen": "avg_price_per_square_meter",
@@ -24,6 +30,16 @@ average_name_dict = {
 
 TRACKING_ID = "findsimilarbooks-20"
 
+QUERY_CACHE_TIMEOUT = 15 * 60  # 15min
+# Expired responses are still served this long while they are refreshed
+QUERY_STALE_TIMEOUT = 5 * 60
+QUERY_LOCK_TIMEOUT = 30
+
+single_flight = SingleFlight()
+
+# Artifacts whose change invalidates the model dependent cache entries
+MODEL_ARTIFACTS = ["lda_websom.pkl", "lda_vectorizer.pkl", "lda.pkl"]
+
 
 def extract_and_add_params(url):
     if url is None:
@@ -102,31 +118,183 @@ def get_zipcodes(search):
     return None
 
 
+def model_version(models_dir=None):
+    """Return a short hash identifying the deployed model artifacts.
+
+    Only the names, sizes and modification times are hashed, which avoids
+    reading the large pickles on every worker start.
+    """
+    models_dir = Path(models_dir or Config.MODELS_DIR)
+    digest = hashlib.sha1()
+    for name in MODEL_ARTIFACTS:
+        path = models_dir / name
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+def book_validators(node, model_version):
+    """Return the strong ETag and the Last-Modified date of a book page.
+
+    The page changes with the book document (its date), its SOM cell and the
+    model the cell belongs to.
+    """
+    validator = ":".join(
+        str(value)
+        for value in (
+            node.get("sha"),
+            node.get("date"),
+            node.get("bmu_col"),
+            node.get("bmu_row"),
+            model_version,
+        )
+    )
+    etag = hashlib.sha1(validator.encode("utf-8")).hexdigest()
+    last_modified = (
+        datetime.datetime.fromisoformat(node["date"]).replace(
+            tzinfo=datetime.timezone.utc
+        )
+        if node.get("date")
+        else None
+    )
+    return etag, last_modified
+
+
+# Stands in for the request in the context of the queries of the site itself
+SITE_REQUEST = SimpleNamespace(headers={})
+
+
+def execute_query(query, variables=None, in_process=None):
+    """Execute a GraphQL query and return the response as a dictionary.
+
+    By default the query runs against the graphene schema inside the current
+    worker. With in_process=False it is posted to GRAPHQL_ENDPOINT instead,
+    by its id if it is a persisted query.
+    """
+    if in_process is None:
+        in_process = Config.GRAPHQL_IN_PROCESS
+
+    if not in_process:
+        query_id = persisted_queries.id_of(query)
+        payload = {"id": query_id} if query_id else {"query": query}
+        return requests.post(
+            url=GRAPHQL_ENDPOINT,
+            json={**payload, "variables": variables},
+            headers={"X-RapidAPI-Proxy-Secret": Config.SECRET_KEY},
+        ).json()
+
+    # The resolvers read the request headers from the context and graphene_mongo
+    # sets attributes on it, hence the UserDict like in graphql_view. The
+    # visitor's headers are not forwarded, like with the HTTP endpoint
+    result = execute_document(
+        query, variables, context_value=UserDict(request=SITE_REQUEST)
+    )
+    response = {"data": result.data}
+    if result.errors:
+        response["errors"] = [error.formatted for error in result.errors]
+        logging.error(f"GraphQL errors: {response['errors']}")
+    return response
+
+
+def fetch_query(key, query, variables):
+    """Execute the query and cache the response with its freshness deadline.
+
+    Responses with errors are not cached, a stale entry is served until a
+    refresh succeeds.
+    """
+    response = execute_query(query, variables)
+    if "errors" in response:
+        metrics.incr("get_data.errors")
+        return response
+    cache.set(
+        key,
+        {"response": response, "fresh_until": time() + QUERY_CACHE_TIMEOUT},
+        timeout=QUERY_CACHE_TIMEOUT + QUERY_STALE_TIMEOUT,
+    )
+    return response
+
+
+def load_query(key, query, variables):
+    """Execute a missing query only once across the workers.
+
+    The worker holding the lock executes the query, the others wait for its
+    result and only execute the query themselves if the lock times out.
+    """
+    lock_key = f"lock:{key}"
+    if cache.add(lock_key, True, timeout=QUERY_LOCK_TIMEOUT):
+        try:
+            return fetch_query(key, query, variables)
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time() + QUERY_LOCK_TIMEOUT
+    while time() < deadline:
+        sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.incr("get_data.coalesced")
+            return entry["response"]
+    return fetch_query(key, query, variables)
+
+
+def refresh_in_background(key, query, variables):
+    """Refresh a stale entry in a background thread of one worker."""
+    refresh_key = f"refresh:{key}"
+    if not cache.add(refresh_key, True, timeout=QUERY_LOCK_TIMEOUT):
+        return
+
+    app = flask.current_app._get_current_object()
+
+    def refresh():
+        with app.test_request_context():
+            try:
+                fetch_query(key, query, variables)
+                metrics.incr("get_data.refreshes")
+            except Exception as e:
+                logging.error(f"Refreshing {key} failed: {e}")
+            finally:
+                cache.delete(refresh_key)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+
 def get_data(
-    query_string,
-    filter_string,
+    query,
+    variables,
     resolver_name,
+    model_dependent=False,
 ):
-    CACHE_TIMEOUT = 15 * 60  # 15min
     t1_start = perf_counter()
 
-    query = query_string.format(
-        filter_string,
-    )
-
-    logging.debug(f"Query:\n{query}")
+    logging.debug(f"Query:\n{query}\nVariables: {variables}")
 
-    # Make use only of the page specific string to hash a key
-    hashed_query = hashlib.sha1(query.encode("utf-8")).hexdigest()
-    response = cache.get(hashed_query)
+    # The query and its variables identify the response
+    hashed_query = hashlib.sha1(
+        (query + json.dumps(variables, sort_keys=True, default=str)).encode("utf-8")
+    ).hexdigest()
+    if model_dependent:
+        # Results holding SOM assignments are only valid for the current model
+        hashed_query = f"{flask.current_app.config['MODEL_VERSION']}:{hashed_query}"
+    key = f"query:{hashed_query}"
     logging.debug(f"hashed_query: {hashed_query}")
-    if response is None:
-        response = requests.post(
-            url=GRAPHQL_ENDPOINT,
-            json={"query": query},
-            headers={"X-RapidAPI-Proxy-Secret": Config.SECRET_KEY},
-        ).json()
-        cache.set(hashed_query, response, timeout=CACHE_TIMEOUT)
+
+    entry = cache.get(key)
+    if entry is None:
+        metrics.incr("get_data.misses")
+        response, shared = single_flight.do(
+            key, lambda: load_query(key, query, variables)
+        )
+        if shared:
+            metrics.incr("get_data.coalesced")
+    elif entry["fresh_until"] < time():
+        # Serve the stale response while one worker refreshes it
+        metrics.incr("get_data.stale_hits")
+        refresh_in_background(key, query, variables)
+        response = entry["response"]
+    else:
+        metrics.incr("get_data.fresh_hits")
+        response = entry["response"]
 
     books = response["data"][resolver_name]["edges"]
 
@@ -141,26 +309,19 @@ def query_data(
     query_string,
     filter_dict,
     resolver_name="all_books",
+    model_dependent=False,
 ):
-    query = []
-    for filter_key, filter_value in filter_dict.items():
-        if filter_value is not None:
-            if isinstance(filter_value, str):
-                filter_value = filter_value.replace('"', "'")
-                query.append(f'{filter_key}: "{filter_value}"')
-            else:
-                if isinstance(filter_value, bool):
-                    filter_value = f"{filter_value}".lower()
-
-                if isinstance(filter_value, list):
-                    filter_value = json.dumps(filter_value)
-
-                query.append(f"{filter_key}: {filter_value}")
-    filter_string = "{" + ",".join(query) + "}"
+    """Run one of the queries of constants.py with filter_dict as $filters."""
+    filters = {
+        filter_key: filter_value
+        for filter_key, filter_value in filter_dict.items()
+        if filter_value is not None
+    }
     return get_data(
         query_string,
-        filter_string,
+        {"filters": filters} if filters else {},
         resolver_name,
+        model_dependent=model_dependent,
     )
 
 
@@ -0,0 +1,36 @@
+import logging
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from spiders.bookspider.bookspider.models import Book
+
+
+def top_book_shas(top_n):
+    """Return the shas of the top_n books by ratings_count."""
+    books = (
+        Book.objects(sha__ne=None, title__ne=None)
+        .only("sha")
+        .order_by("-ratings_count")
+        .limit(top_n)
+        .as_pymongo()
+    )
+    return [book["sha"] for book in books]
+
+
+def warm_cache(app, top_n, workers=8):
+    """Render the most rated book pages once so they are served from the cache."""
+    t1_start = perf_counter()
+    with app.app_context():
+        shas = top_book_shas(top_n)
+
+    def render(sha):
+        with app.test_client() as client:
+            return client.get(f"/book/{sha}/").status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        status_codes = list(executor.map(render, shas))
+
+    failed = sum(status_code != 200 for status_code in status_codes)
+    logging.info(
+        f"Warmed {len(shas) - failed}/{len(shas)} book pages in {(perf_counter() - t1_start):.2f} seconds"
+    )
+    return failed
@@ -0,0 +1,31 @@
+import argparse
+from similarbooks import create_app
+from similarbooks.config import Config
+from app.similarbooks.main.warmup import warm_cache
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Pre-render the most rated book pages into the shared cache.",
+        prog="warm_cache",
+    )
+    parser.add_argument(
+        "--top_n",
+        help="Number of books by ratings_count to render.",
+        default=Config.WARM_CACHE_TOP_N or 1000,
+        type=int,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of pages rendered in parallel.",
+        default=8,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    som_app = create_app()
+    warm_cache(som_app, top_n=args.top_n, workers=args.workers)
@@ -1,17 +1,47 @@
+import os
+import argparse
+import logging
 import multiprocessing
 import gunicorn.app.base
 from similarbooks import create_app
+from similarbooks.config import Config
+from app.similarbooks.main.warmup import warm_cache
+from app.similarbooks.main.suggest import title_index
+from app.similarbooks.main.text_inference import text_inference
+from spiders.bookspider.bookspider.models import Book, Websom
+from spiders.bookspider.bookspider.indexes import verify_indexes
 
 
-def number_of_workers():
-    # return (multiprocessing.cpu_count() * 2) + 1
-    return 6
+def number_of_workers(worker_class="sync"):
+    # Async workers serve many requests per process, sync and threaded
+    # workers need more processes to overlap the Mongo round-trips
+    if worker_class == "gevent":
+        return multiprocessing.cpu_count() + 1
+    return (multiprocessing.cpu_count() * 2) + 1
+
+
+def post_worker_init(worker):
+    # Build the in-memory indexes when a worker starts, not on its first request
+    title_index.ensure_loaded()
+    if Config.PRELOAD_MODELS:
+        # Unpickled per worker, the first similar_to_text request would wait
+        text_inference.preload()
+
+
+def startup_checks():
+    """Verify the indexes and warm the cache, run in a short-lived process."""
+    som_app = create_app()
+    # Missing indexes are only logged, app/check_indexes.py --create builds them
+    verify_indexes(Book, Websom)
+    if Config.WARM_CACHE_TOP_N:
+        # Fill the shared cache tier before the workers take traffic
+        warm_cache(som_app, top_n=Config.WARM_CACHE_TOP_N)
 
 
 class StandaloneApplication(gunicorn.app.base.BaseApplication):
-    def __init__(self, app, options=None):
+    def __init__(self, app_factory, options=None):
         self.options = options or {}
-        self.application = app
+        self.app_factory = app_factory
         super().__init__()
 
     def load_config(self):
@@ -24,14 +54,84 @@ class StandaloneApplication(gunicorn.app.base.BaseApplication):
             self.cfg.set(key.lower(), value)
 
     def load(self):
-        return self.application
+        # Called once in the master with preload_app, else in every worker
+        return self.app_factory()
+
+
+def command_line_arguments():
+    """Define and handle command line interface, defaults come from the env"""
+    parser = argparse.ArgumentParser(
+        description="Serve findsimilarbooks.com with gunicorn.", prog="wsgi"
+    )
+    parser.add_argument(
+        "--bind",
+        help="Address to bind to.",
+        default=os.environ.get("GUNICORN_BIND", "127.0.0.1:8000"),
+        type=str,
+    )
+    parser.add_argument(
+        "--worker_class",
+        help="Gunicorn worker class. gevent needs the gevent package.",
+        choices=["sync", "gthread", "gevent"],
+        default=os.environ.get("GUNICORN_WORKER_CLASS", "sync"),
+        type=str,
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of worker processes, derived from the cores by default.",
+        default=os.environ.get("GUNICORN_WORKERS"),
+        type=int,
+    )
+    parser.add_argument(
+        "--threads",
+        help="Threads per worker for the gthread worker class.",
+        default=int(os.environ.get("GUNICORN_THREADS", 4)),
+        type=int,
+    )
+    parser.add_argument(
+        "--timeout",
+        help="Seconds before a silent worker is restarted.",
+        default=int(os.environ.get("GUNICORN_TIMEOUT", 120)),
+        type=int,
+    )
+    parser.add_argument(
+        "--preload",
+        help="Load the app in the master before forking the workers.",
+        action="store_true",
+        default=os.environ.get("GUNICORN_PRELOAD", "false").lower() == "true",
+    )
+    parser.add_argument(
+        "--max_requests",
+        help="Restart a worker after this many requests, 0 disables it.",
+        default=int(os.environ.get("GUNICORN_MAX_REQUESTS", 0)),
+        type=int,
+    )
+    parser.add_argument(
+        "--max_requests_jitter",
+        help="Random jitter added to max_requests so workers do not restart together.",
+        default=int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", 0)),
+        type=int,
+    )
+    return parser.parse_args()
 
 
 if __name__ == "__main__":
-    som_app = create_app()
+    args = command_line_arguments()
+    # The master forks the workers without an app or MongoClient of its own
+    startup = multiprocessing.Process(target=startup_checks)
+    startup.start()
+    startup.join()
+    if startup.exitcode != 0:
+        logging.error(f"Startup checks exited with {startup.exitcode}")
     options = {
-        "bind": "%s:%s" % ("127.0.0.1", "8000"),
-        "workers": number_of_workers(),
-        "timeout": 120,
+        "bind": args.bind,
+        "worker_class": args.worker_class,
+        "workers": args.workers or number_of_workers(args.worker_class),
+        "threads": args.threads if args.worker_class == "gthread" else 1,
+        "timeout": args.timeout,
+        "preload_app": args.preload,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "post_worker_init": post_worker_init,
     }
-    StandaloneApplication(som_app, options).run()
+    StandaloneApplication(create_app, options).run()
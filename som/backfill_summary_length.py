@@ -0,0 +1,82 @@
+import argparse
+import logging
+import tqdm
+import mongoengine as me
+from app.similarbooks.config import Config
+from spiders.bookspider.bookspider.models import Book
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+# Same code point count as len() in the spider pipeline
+SUMMARY_LENGTH_UPDATE = [
+    {"$set": {"summary_length": {"$strLenCP": {"$ifNull": ["$summary", ""]}}}}
+]
+
+
+def backfill(batch_size, recompute, create_indexes):
+    collection = Book._get_collection()
+    query = {} if recompute else {"summary_length": {"$exists": False}}
+    total = collection.count_documents(query)
+    logging.info(f"Backfilling the summary length of {total} books")
+
+    # Batches by _id keep every update short and let the job be resumed
+    last_id = None
+    with tqdm.tqdm(total=total) as progress:
+        while True:
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            ids = [
+                book["_id"]
+                for book in collection.find(batch_query, {"_id": 1})
+                .sort("_id", 1)
+                .limit(batch_size)
+            ]
+            if not ids:
+                break
+            collection.update_many({"_id": {"$in": ids}}, SUMMARY_LENGTH_UPDATE)
+            last_id = ids[-1]
+            progress.update(len(ids))
+
+    logging.info("Backfill finished")
+    if create_indexes:
+        # Book.meta disables auto_create_index, the indexes are only built here
+        # and by app/check_indexes.py --create
+        logging.info("Creating the missing Book indexes ...")
+        Book.ensure_indexes()
+        logging.info("Indexes created")
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Store the summary length of every book for indexed filtering.",
+        prog="backfill_summary_length",
+    )
+    parser.add_argument(
+        "--batch_size",
+        help="Number of books updated per command.",
+        default=10_000,
+        type=int,
+    )
+    parser.add_argument(
+        "--recompute",
+        help="Recompute the length of books that already have one.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--create_indexes",
+        help="Build the missing Book indexes after the backfill.",
+        action="store_true",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    me.connect(db="similarbooks", host=Config.MONGODB_SETTINGS["host"])
+    backfill(args.batch_size, args.recompute, args.create_indexes)
@@ -8,7 +8,7 @@ from pathlib import Path
 from dash import dash_table
 import Scaler as Scaler
 from sklearn.feature_extraction.text import CountVectorizer
-from som.utils import preprocess_text, get_top_bmus, model_dict, get_surface_state
+from som.utils import preprocess_text, get_top_bmus, model_registry, get_surface_state
 
 PARENT_DIR = Path(__file__).resolve().parent
 
@@ -24,12 +24,12 @@ with open(PARENT_DIR / Path(f"data/gutenberg_books/1.txt"), "r") as file_model:
     text = file_model.read()
     preprocessed_text_gb = preprocess_text(text)
 
-tasks_vectorized = model_dict["vectorizer"].transform(
+tasks_vectorized = model_registry["vectorizer"].transform(
     [preprocessed_text_ab, preprocessed_text_gb]
 )
-tasks_topic_dist = model_dict["lda"].transform(tasks_vectorized)
-active_map = model_dict["lda_websom"].get_surface_state(data=tasks_topic_dist)
+tasks_topic_dist = model_registry["lda"].transform(tasks_vectorized)
+active_map = model_registry["lda_websom"].get_surface_state(data=tasks_topic_dist)
 print(active_map)
 
-bmu_nodes = get_top_bmus(model_dict["lda_websom"], active_map, top_n=1)
+bmu_nodes = get_top_bmus(model_registry["lda_websom"], active_map, top_n=1)
 print(bmu_nodes)
@@ -5,13 +5,14 @@ import plotly.graph_objects as go
 import pandas as pd
 import pickle
 from pathlib import Path
+from app.similarbooks.config import Config
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
 from dash import dash_table
 from som.utils import parse_gutenberg_info, query_debug_display
 
-PARENT_DIR = Path(__file__).resolve().parent
+MODELS_DIR = Config.MODELS_DIR
 
 
 # Function to create the SOM plot
@@ -69,7 +70,7 @@ matched_list = None
 def load_model():
     global som, matched_list
 
-    with open(PARENT_DIR / Path(f"models/lda_websom.pkl"), "rb") as file_model:
+    with open(MODELS_DIR / "lda_websom.pkl", "rb") as file_model:
         som = pickle.load(file_model)
 
     SOM_MATRIX = {}
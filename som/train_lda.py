@@ -14,12 +14,13 @@ from scipy.spatial.distance import jensenshannon
 from Scaler import Scaler
 from time import perf_counter
 from pathlib import Path
+from app.similarbooks.config import Config
 import pickle
 from som.utils import (
     encode_kaski,
     preprocess_text,
     load_documents_list,
-    query_training_data,
+    stream_training_data,
     load_documents_graphql,
 )
 
@@ -30,6 +31,7 @@ logging.basicConfig(
 )
 
 PARENT_DIR = Path(__file__).resolve().parent
+MODELS_DIR = Config.MODELS_DIR
 
 
 def train_lda(
@@ -40,32 +42,27 @@ def train_lda(
     use_cache_doc_topic_dist=True,
 ):
     if use_cache_lda_summaries_dict and os.path.exists(
-        PARENT_DIR / Path(f"models/lda_summaries_dict.pkl")
+        MODELS_DIR / "lda_summaries_dict.pkl"
     ):
         logging.info(f"Loading cached summaries dict ...")
-        with open(
-            PARENT_DIR / Path(f"models/lda_summaries_dict.pkl"), "rb"
-        ) as file_model:
+        with open(MODELS_DIR / "lda_summaries_dict.pkl", "rb") as file_model:
             summaries_dict = pickle.load(file_model)
     else:
         logging.info(f"Querying new summaries dict ...")
         # documents = load_documents_graphql(PARENT_DIR / "data")
-        summaries_dict = query_training_data(limited=False)
+        # Kept whole, it is pickled as the cache and read again for the shas
+        summaries_dict = list(stream_training_data())
         # summaries_dict.extend(documents)
 
-        with open(
-            PARENT_DIR / Path(f"models/lda_summaries_dict.pkl"), "wb"
-        ) as file_model:
+        with open(MODELS_DIR / "lda_summaries_dict.pkl", "wb") as file_model:
             pickle.dump(summaries_dict, file_model, pickle.HIGHEST_PROTOCOL)
 
-    if use_cache_lda_corpus and os.path.exists(
-        PARENT_DIR / Path(f"models/lda_dtm.pkl")
-    ):
+    if use_cache_lda_corpus and os.path.exists(MODELS_DIR / "lda_dtm.pkl"):
         logging.info(f"Loading already vectorizer ...")
-        with open(PARENT_DIR / Path(f"models/lda_vectorizer.pkl"), "rb") as file_model:
+        with open(MODELS_DIR / "lda_vectorizer.pkl", "rb") as file_model:
             vectorizer = pickle.load(file_model)
         logging.info(f"Loading already encoded DTM ...")
-        with open(PARENT_DIR / Path(f"models/lda_dtm.pkl"), "rb") as file_model:
+        with open(MODELS_DIR / "lda_dtm.pkl", "rb") as file_model:
             dtm = pickle.load(file_model)
     else:
         logging.info(f"Preparing summaries ...")
@@ -83,15 +80,15 @@ def train_lda(
         logging.info(f"Fitting monogram vectorizer ...")
         dtm = vectorizer.fit_transform(summaries)
 
-        with open(PARENT_DIR / Path(f"models/lda_vectorizer.pkl"), "wb") as file_model:
+        with open(MODELS_DIR / "lda_vectorizer.pkl", "wb") as file_model:
             pickle.dump(vectorizer, file_model, pickle.HIGHEST_PROTOCOL)
 
-        with open(PARENT_DIR / Path(f"models/lda_dtm.pkl"), "wb") as file_model:
+        with open(MODELS_DIR / "lda_dtm.pkl", "wb") as file_model:
             pickle.dump(dtm, file_model, pickle.HIGHEST_PROTOCOL)
 
-    if use_cache_lda and os.path.exists(PARENT_DIR / Path(f"models/lda.pkl")):
+    if use_cache_lda and os.path.exists(MODELS_DIR / "lda.pkl"):
         logging.info(f"Loading already encoded LDA model ...")
-        with open(PARENT_DIR / Path(f"models/lda.pkl"), "rb") as file_model:
+        with open(MODELS_DIR / "lda.pkl", "rb") as file_model:
             lda = pickle.load(file_model)
     else:
         logging.info(f"Training LDA model ...")
@@ -103,14 +100,12 @@ def train_lda(
         )
         lda.fit(dtm)
 
-        with open(PARENT_DIR / Path(f"models/lda.pkl"), "wb") as file_model:
+        with open(MODELS_DIR / "lda.pkl", "wb") as file_model:
             pickle.dump(lda, file_model, pickle.HIGHEST_PROTOCOL)
 
-    if use_cache_doc_topic_dist and os.path.exists(
-        PARENT_DIR / Path(f"models/doc_topic_dist.pkl")
-    ):
+    if use_cache_doc_topic_dist and os.path.exists(MODELS_DIR / "doc_topic_dist.pkl"):
         logging.info(f"Loading document distance data frame ...")
-        with open(PARENT_DIR / Path(f"models/doc_topic_dist.pkl"), "rb") as file_model:
+        with open(MODELS_DIR / "doc_topic_dist.pkl", "rb") as file_model:
             doc_topic_dist = pickle.load(file_model)
     else:
         logging.info(f"Generating doc_topic_dist ...")
@@ -118,7 +113,7 @@ def train_lda(
             lda.transform(dtm),
             index=[item.get("node").get("sha") for item in summaries_dict],
         )
-        with open(PARENT_DIR / Path(f"models/doc_topic_dist.pkl"), "wb") as file_model:
+        with open(MODELS_DIR / "doc_topic_dist.pkl", "wb") as file_model:
             pickle.dump(doc_topic_dist, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Example query
@@ -176,33 +171,28 @@ def train_gensim_lda(
 ):
     # Load or query document summaries
     if use_cache_lda_summaries_dict and os.path.exists(
-        PARENT_DIR / Path(f"models/lda_summaries_dict.pkl")
+        MODELS_DIR / "lda_summaries_dict.pkl"
     ):
         logging.info(f"Loading cached summaries dict ...")
-        with open(
-            PARENT_DIR / Path(f"models/lda_summaries_dict.pkl"), "rb"
-        ) as file_model:
+        with open(MODELS_DIR / "lda_summaries_dict.pkl", "rb") as file_model:
             summaries_dict = pickle.load(file_model)
     else:
         logging.info(f"Querying new summaries dict ...")
         # documents = load_documents_graphql(PARENT_DIR / "data")
-        summaries_dict = query_training_data(limited=False)
+        # Kept whole, it is pickled as the cache and read again for the shas
+        summaries_dict = list(stream_training_data())
         # summaries_dict.extend(documents)
 
-        with open(
-            PARENT_DIR / Path(f"models/lda_summaries_dict.pkl"), "wb"
-        ) as file_model:
+        with open(MODELS_DIR / "lda_summaries_dict.pkl", "wb") as file_model:
             pickle.dump(summaries_dict, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Load or generate the Gensim corpus and dictionary
-    if use_cache_lda_corpus and os.path.exists(
-        PARENT_DIR / Path(f"models/lda_corpus.pkl")
-    ):
+    if use_cache_lda_corpus and os.path.exists(MODELS_DIR / "lda_corpus.pkl"):
         logging.info(f"Loading cached Gensim corpus ...")
-        with open(PARENT_DIR / Path(f"models/lda_corpus.pkl"), "rb") as file_model:
+        with open(MODELS_DIR / "lda_corpus.pkl", "rb") as file_model:
             corpus = pickle.load(file_model)
     else:
-        if not os.path.exists(PARENT_DIR / Path(f"models/lda_corpus.mm")):
+        if not os.path.exists(MODELS_DIR / "lda_corpus.mm"):
             logging.info(f"Preparing summaries ...")
             summaries = [
                 (item.get("node").get("title") or "")
@@ -214,27 +204,25 @@ def train_gensim_lda(
             # Build dictionary and corpus using memory-efficient method
             build_dictionary_and_corpus(
                 summaries,
-                PARENT_DIR / Path(f"models/lda_dictionary.pkl"),
-                PARENT_DIR / Path(f"models/lda_corpus.mm"),
+                MODELS_DIR / "lda_dictionary.pkl",
+                MODELS_DIR / "lda_corpus.mm",
             )
 
         # Load the generated corpus for further processing
-        corpus = MmCorpus(str(PARENT_DIR / Path(f"models/lda_corpus.mm")))
+        corpus = MmCorpus(str(MODELS_DIR / "lda_corpus.mm"))
 
-        with open(PARENT_DIR / Path(f"models/lda_corpus.pkl"), "wb") as file_model:
+        with open(MODELS_DIR / "lda_corpus.pkl", "wb") as file_model:
             pickle.dump(corpus, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Load or train the LDA model
-    if use_cache_lda and os.path.exists(PARENT_DIR / Path(f"models/lda_gensim.pkl")):
+    if use_cache_lda and os.path.exists(MODELS_DIR / "lda_gensim.pkl"):
         logging.info(f"Loading cached Gensim LDA model ...")
-        with open(PARENT_DIR / Path(f"models/lda_gensim.pkl"), "rb") as file_model:
+        with open(MODELS_DIR / "lda_gensim.pkl", "rb") as file_model:
             lda = pickle.load(file_model)
     else:
-        if os.path.exists(PARENT_DIR / Path(f"models/lda_dictionary.pkl")):
+        if os.path.exists(MODELS_DIR / "lda_dictionary.pkl"):
             logging.info(f"Loading dictionary ...")
-            with open(
-                PARENT_DIR / Path(f"models/lda_dictionary.pkl"), "rb"
-            ) as file_model:
+            with open(MODELS_DIR / "lda_dictionary.pkl", "rb") as file_model:
                 dictionary = pickle.load(file_model)
 
         logging.info(f"Training Gensim LDA model ...")
@@ -247,17 +235,15 @@ def train_gensim_lda(
             workers=os.cpu_count(),  # Use all available cores
         )
 
-        with open(PARENT_DIR / Path(f"models/lda_gensim.pkl"), "wb") as file_model:
+        with open(MODELS_DIR / "lda_gensim.pkl", "wb") as file_model:
             pickle.dump(lda, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Generate document-topic distributions
     if use_cache_doc_topic_dist and os.path.exists(
-        PARENT_DIR / Path(f"models/doc_topic_dist_gensim.pkl")
+        MODELS_DIR / "doc_topic_dist_gensim.pkl"
     ):
         logging.info(f"Loading document distance data frame ...")
-        with open(
-            PARENT_DIR / Path(f"models/doc_topic_dist_gensim.pkl"), "rb"
-        ) as file_model:
+        with open(MODELS_DIR / "doc_topic_dist_gensim.pkl", "rb") as file_model:
             doc_topic_dist = pickle.load(file_model)
     else:
         logging.info(f"Generating document-topic distributions ...")
@@ -273,9 +259,7 @@ def train_gensim_lda(
         # Set the index to book_id
         doc_topic_dist.index = [item.get("node").get("sha") for item in summaries_dict]
 
-        with open(
-            PARENT_DIR / Path(f"models/doc_topic_dist_gensim.pkl"), "wb"
-        ) as file_model:
+        with open(MODELS_DIR / "doc_topic_dist_gensim.pkl", "wb") as file_model:
             pickle.dump(doc_topic_dist, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Example query
@@ -9,19 +9,19 @@ from sklearn.decomposition import LatentDirichletAllocation
 from Scaler import Scaler
 from time import perf_counter
 from pathlib import Path
+from app.similarbooks.config import Config
 import pickle
 from tqdm import tqdm  # For progress bar
 from som.train_lda import train_lda, train_gensim_lda
 import matplotlib.pyplot as plt
 
-
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
     level=logging.INFO,
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
-PARENT_DIR = Path(__file__).resolve().parent
+MODELS_DIR = Config.MODELS_DIR
 
 # doc_topic_dist = train_lda()
 doc_topic_dist = train_lda(
@@ -63,6 +63,6 @@ logging.info(f"Elapsed time for training in hours: {delta_seconds / 3600.0}")
 
 som.labels = dict(zip(doc_topic_dist.index, som.bmus))
 
-with open(PARENT_DIR / Path(f"models/lda_websom.pkl"), "wb") as file_model:
+with open(MODELS_DIR / "lda_websom.pkl", "wb") as file_model:
     som.name = f"lda_websom"
     pickle.dump(som, file_model, pickle.HIGHEST_PROTOCOL)
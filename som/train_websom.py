@@ -8,6 +8,7 @@ from sklearn.feature_extraction.text import CountVectorizer
 from Scaler import Scaler
 from time import perf_counter
 from pathlib import Path
+from app.similarbooks.config import Config
 import pickle
 from tqdm import tqdm  # For progress bar
 from som.utils import (
@@ -16,35 +17,34 @@ from som.utils import (
     load_documents_dict,
     get_hit_histogram,
     draw_barchart,
-    query_training_data,
+    stream_training_data,
 )
 import matplotlib.pyplot as plt
 
 import numpy as np
 import pandas as pd
 
-
 logging.basicConfig(
     format="%(asctime)s %(levelname)-8s %(message)s",
     level=logging.INFO,
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
-PARENT_DIR = Path(__file__).resolve().parent
+MODELS_DIR = Config.MODELS_DIR
 
-with open(PARENT_DIR / Path(f"models/wordcategory.pkl"), "rb") as file_model:
+with open(MODELS_DIR / "wordcategory.pkl", "rb") as file_model:
     wordcategory_som = pickle.load(file_model)
 
-if os.path.exists(PARENT_DIR / Path(f"models/hit_df.pkl")):
+if os.path.exists(MODELS_DIR / "hit_df.pkl"):
     logging.info(f"Loading already processed hit_df ...")
-    with open(PARENT_DIR / Path(f"models/hit_df.pkl"), "rb") as file_model:
+    with open(MODELS_DIR / "hit_df.pkl", "rb") as file_model:
         hit_df = pickle.load(file_model)
 else:
     logging.info(f"Generating hit histogram ...")
-    summaries = query_training_data(limited=False)
+    summaries = stream_training_data()
     hit_data = []  # To collect rows for hit_df
 
-    with open(PARENT_DIR / Path(f"models/som_vectorizer.pkl"), "rb") as file_model:
+    with open(MODELS_DIR / "som_vectorizer.pkl", "rb") as file_model:
         vectorizer = pickle.load(file_model)
 
     for book in tqdm(summaries):
@@ -88,7 +88,7 @@ else:
     # Concatenate all hit_histogram DataFrames into a single DataFrame
     hit_df = pd.concat(hit_data)
 
-    with open(PARENT_DIR / Path(f"models/hit_df.pkl"), "wb") as file_model:
+    with open(MODELS_DIR / "hit_df.pkl", "wb") as file_model:
         pickle.dump(hit_df, file_model, pickle.HIGHEST_PROTOCOL)
 
 
@@ -123,6 +123,6 @@ logging.info(f"Elapsed time for training in hours: {delta_seconds / 3600.0}")
 
 som.labels = dict(zip(hit_df.index, som.bmus))
 
-with open(PARENT_DIR / Path(f"models/websom.pkl"), "wb") as file_model:
+with open(MODELS_DIR / "websom.pkl", "wb") as file_model:
     som.name = f"websom"
     pickle.dump(som, file_model, pickle.HIGHEST_PROTOCOL)
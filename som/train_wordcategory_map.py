@@ -8,12 +8,13 @@ from sklearn.feature_extraction.text import CountVectorizer
 from Scaler import Scaler
 from time import perf_counter
 from pathlib import Path
+from app.similarbooks.config import Config
 import pickle
 from som.utils import (
     encode_kaski,
     preprocess_text,
     load_documents_list,
-    query_training_data,
+    stream_training_data,
 )
 
 logging.basicConfig(
@@ -23,21 +24,22 @@ logging.basicConfig(
 )
 
 PARENT_DIR = Path(__file__).resolve().parent
+MODELS_DIR = Config.MODELS_DIR
 
-if os.path.exists(PARENT_DIR / Path(f"models/word_occurrences.pkl")) and os.path.exists(
-    PARENT_DIR / Path(f"models/bigram_occurrences.pkl")
+if os.path.exists(MODELS_DIR / "word_occurrences.pkl") and os.path.exists(
+    MODELS_DIR / "bigram_occurrences.pkl"
 ):
     logging.info(f"Loading already processed monogram and bigram dtm ...")
-    with open(PARENT_DIR / Path(f"models/word_occurrences.pkl"), "rb") as file_model:
+    with open(MODELS_DIR / "word_occurrences.pkl", "rb") as file_model:
         word_occurrences = pickle.load(file_model)
 
-    with open(PARENT_DIR / Path(f"models/bigram_occurrences.pkl"), "rb") as file_model:
+    with open(MODELS_DIR / "bigram_occurrences.pkl", "rb") as file_model:
         bigram_occurrences = pickle.load(file_model)
 else:
-    summaries_dict = query_training_data(limited=False)
+    # Only the texts are kept, both vectorizers read them
     summaries = [
         (item.get("node").get("title") or "") + " " + item.get("node").get("summary")
-        for item in summaries_dict
+        for item in stream_training_data()
     ]
 
     # documents_directory = PARENT_DIR / "data/"
@@ -50,7 +52,7 @@ else:
     logging.info(f"Fitting monogram vectorizer ...")
     dtm = vectorizer.fit_transform(summaries)
 
-    with open(PARENT_DIR / Path(f"models/som_vectorizer.pkl"), "wb") as file_model:
+    with open(MODELS_DIR / "som_vectorizer.pkl", "wb") as file_model:
         pickle.dump(vectorizer, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Step 4: Sum up the word occurrences across all summaries
@@ -58,7 +60,7 @@ else:
         dtm.sum(axis=0).flatten(), columns=vectorizer.get_feature_names_out()
     )
 
-    with open(PARENT_DIR / Path(f"models/word_occurrences.pkl"), "wb") as file_model:
+    with open(MODELS_DIR / "word_occurrences.pkl", "wb") as file_model:
         pickle.dump(word_occurrences, file_model, pickle.HIGHEST_PROTOCOL)
 
     # Step 1: Create a Bigram Document-Term Matrix
@@ -74,7 +76,7 @@ else:
         columns=vectorizer_bigram.get_feature_names_out(),
     )
 
-    with open(PARENT_DIR / Path(f"models/bigram_occurrences.pkl"), "wb") as file_model:
+    with open(MODELS_DIR / "bigram_occurrences.pkl", "wb") as file_model:
         pickle.dump(bigram_occurrences, file_model, pickle.HIGHEST_PROTOCOL)
 
 # Step 1: Get the number of columns (terms) from dtm_df
@@ -86,13 +88,13 @@ word_df = pd.DataFrame(np.random.uniform(0.0, 1.0, size=(90, num_columns)))
 # Step 3: Assign the column names of dtm_df to the new word_df
 word_df.columns = word_occurrences.columns
 
-if os.path.exists(PARENT_DIR / Path(f"models/kaski_df.pkl")):
+if os.path.exists(MODELS_DIR / "kaski_df.pkl"):
     logging.info(f"Loading already encoded kaski df ...")
-    with open(PARENT_DIR / Path(f"models/kaski_df.pkl"), "rb") as file_model:
+    with open(MODELS_DIR / "kaski_df.pkl", "rb") as file_model:
         kaski_df = pickle.load(file_model)
 else:
     kaski_df = encode_kaski(word_df, bigram_occurrences)
-    with open(PARENT_DIR / Path(f"models/kaski_df.pkl"), "wb") as file_model:
+    with open(MODELS_DIR / "kaski_df.pkl", "wb") as file_model:
         pickle.dump(kaski_df, file_model, pickle.HIGHEST_PROTOCOL)
 
 scaler = Scaler()
@@ -131,6 +133,6 @@ logging.info(f"Elapsed time for training in hours: {delta_seconds / 3600.0}")
 
 som.labels = dict(zip(data_train_matrix.index, som.bmus))
 
-with open(PARENT_DIR / Path(f"models/wordcategory.pkl"), "wb") as file_model:
+with open(MODELS_DIR / "wordcategory.pkl", "wb") as file_model:
     som.name = f"wordcategory"
     pickle.dump(som, file_model, pickle.HIGHEST_PROTOCOL)
@@ -6,7 +6,7 @@ import time
 import tqdm
 import requests
 import datetime
-from utils import model_dict
+from utils import model_registry
 from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 from app.similarbooks.config import Config
@@ -14,6 +14,7 @@ from app.similarbooks.main.constants import (
     GRAPHQL_ENDPOINT,
 )
 from som.utils import get_surface_state
+from som.write_similar_db import update_cell
 from spiders.bookspider.bookspider.models import Book, Websom
 
 logging.basicConfig(
@@ -49,13 +50,13 @@ def vectorize_books(books):
     ]
     # Batch vectorization
     logging.info("Vectorizing books in batch ...")
-    return model_dict["vectorizer"].transform(texts)
+    return model_registry["vectorizer"].transform(texts)
 
 
 def lda_transform_batch(tasks_vectorized):
     # Batch LDA transformation
     logging.info("Performing LDA transformation in batch ...")
-    return model_dict["lda"].transform(tasks_vectorized)
+    return model_registry["lda"].transform(tasks_vectorized)
 
 
 def som_mapping_batch(tasks_topic_dist_batch):
@@ -75,9 +76,10 @@ def process_batch(books):
     activation_maps = som_mapping_batch(tasks_topic_dist_batch)
 
     # Step 4: Get BMUs
-    bmu_nodes = model_dict["lda_websom"].get_bmus(activation_maps)
+    bmu_nodes = model_registry["lda_websom"].get_bmus(activation_maps)
 
     # Step 5: Update database in batch
+    updated_cells = set()
     for i, book in enumerate(books):
         sha = book["node"]["sha"]
         bmu_node = bmu_nodes[i]
@@ -95,8 +97,13 @@ def process_batch(books):
         Websom.objects(**bmu_update).update_one(
             add_to_set__matched_list=sha  # Add to list without duplication
         )
+        updated_cells.add((bmu_update["bmu_col"], bmu_update["bmu_row"]))
         logging.info(f"Updated book {sha} to bmu node {bmu_update} in Websom")
 
+    # Step 6: Refresh the materialized similar list of each touched cell once
+    for bmu_col, bmu_row in updated_cells:
+        update_cell(bmu_col, bmu_row)
+
 
 def fetch_data():
     logging.info("Getting data ...")
@@ -5,7 +5,7 @@ import time
 import tqdm
 import requests
 import datetime
-from utils import model_dict
+from utils import model_registry
 import numpy as np
 from app.similarbooks.config import Config
 from app.similarbooks.main.constants import (
@@ -43,8 +43,8 @@ def update_model(sha, bmu_update):
 
 def main():
 
-    for row in range(model_dict["lda_websom"].codebook.shape[0]):
-        for col in range(model_dict["lda_websom"].codebook.shape[1]):
+    for row in range(model_registry["lda_websom"].codebook.shape[0]):
+        for col in range(model_registry["lda_websom"].codebook.shape[1]):
             bmu = {
                 "bmu_col": col,
                 "bmu_row": row,
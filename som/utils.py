@@ -7,7 +7,9 @@ import json
 import logging
 import datetime
 import random
+import threading
 import requests
+from time import perf_counter
 import pandas as pd
 import numpy as np
 from tqdm import tqdm  # For progress bar
@@ -18,6 +20,8 @@ from scipy.ndimage import gaussian_filter1d
 from scipy.spatial.distance import jensenshannon
 from app.similarbooks.main.constants import (
     GRAPHQL_ENDPOINT,
+    EXPORT_ENDPOINT,
+    BULK_MAX_SHAS,
 )
 from app.similarbooks.config import Config
 
@@ -36,22 +40,72 @@ def load_file(path):
     return obj
 
 
-model_dict = {
-    "lda_websom": load_file(f"som/models/lda_websom.pkl"),
-    # "doc_topic_dist": load_file(f"som/models/doc_topic_dist.pkl"),
-    "vectorizer": load_file(f"som/models/lda_vectorizer.pkl"),
-    "lda": load_file(f"som/models/lda.pkl"),
-}
+class ModelRegistry:
+    """The model pickles of a models directory, each loaded on first access.
+
+    Scripts only pay the unpickling time and memory of the models they use.
+    Servers call preload before taking traffic. The seconds each load took
+    are kept in load_seconds.
+    """
+
+    FILES = {
+        "lda_websom": "lda_websom.pkl",
+        "vectorizer": "lda_vectorizer.pkl",
+        "lda": "lda.pkl",
+        "doc_topic_dist": "doc_topic_dist.pkl",
+    }
+
+    def __init__(self, models_dir=None, files=None):
+        self.models_dir = Path(models_dir or Config.MODELS_DIR)
+        self.files = files or self.FILES
+        self.load_seconds = {}
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if name not in self._models:
+            with self._lock:
+                # Another thread may have loaded it while this one waited
+                if name not in self._models:
+                    self._models[name] = self._load(name)
+        return self._models[name]
+
+    def get(self, name, default=None):
+        if name not in self.files:
+            return default
+        return self[name]
+
+    def _load(self, name):
+        path = self.models_dir / self.files[name]
+        t_start = perf_counter()
+        model = load_file(path)
+        self.load_seconds[name] = perf_counter() - t_start
+        logging.info(
+            f"Loaded {name} from {path} in {self.load_seconds[name]:.2f} seconds"
+        )
+        return model
+
+    def preload(self, names=None):
+        """Load the models (all by default), return the seconds of new loads."""
+        loaded = {}
+        for name in names or self.files:
+            if name not in self._models:
+                self[name]
+                loaded[name] = self.load_seconds[name]
+        return loaded
+
+
+model_registry = ModelRegistry()
 
 
 def get_similar_books_lda(text, top_n=10):
     # Vectorize the input text
-    tasks_vectorized = model_dict.get("vectorizer").transform([text])
+    tasks_vectorized = model_registry.get("vectorizer").transform([text])
     # Get the topic distribution for the input text
-    tasks_topic_dist = model_dict.get("lda").transform(tasks_vectorized)[0]
+    tasks_topic_dist = model_registry.get("lda").transform(tasks_vectorized)[0]
 
     # Get document topic distributions
-    df = model_dict.get("doc_topic_dist")
+    df = model_registry.get("doc_topic_dist")
 
     logging.info("Calculating distances ....")
     # Calculate Jensen-Shannon distance for all documents at once using NumPy
@@ -325,32 +379,36 @@ TRAIN_SOM_QUERY = """
   }}
 }}""".strip()
 
-UNLIMITED_TRAIN_SOM_QUERY = """
-{{
-  all_books (filters: {0}) {{
-    edges {{
-      node {{
-        sha,
-        title,
-        summary,
-      }}
-    }}
-  }}
-}}""".strip()
+TRAIN_SOM_FILTERS = {
+    "summary_length_gte": 400,
+    "language": "English",
+    "spider": "goodreads",
+}
 
 
-def query_training_data(per_page=500, limited=True):
+def stream_training_data():
+    """Yield all training books line by line from the NDJSON export."""
+    with requests.get(
+        url=EXPORT_ENDPOINT,
+        params={
+            "filters": json.dumps(TRAIN_SOM_FILTERS),
+            "fields": "sha,title,summary",
+        },
+        headers={"X-RapidAPI-Proxy-Secret": Config.SECRET_KEY},
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        # The gzip encoding is decoded chunk by chunk as well
+        for line in response.iter_lines():
+            if line:
+                yield {"node": json.loads(line)}
+
+
+def query_training_data(per_page=500):
+    """Return the first per_page training books, stream_training_data yields all."""
     logging.info("Getting data ...")
-    query = (
-        TRAIN_SOM_QUERY.format(
-            '{summary_length_gte: 400, language: "English", spider: "goodreads"}',
-            per_page,
-        )
-        if limited
-        else UNLIMITED_TRAIN_SOM_QUERY.format(
-            '{summary_length_gte: 400, language: "English", spider: "goodreads"}'
-        )
-    )
+    filters = '{summary_length_gte: 400, language: "English", spider: "goodreads"}'
+    query = TRAIN_SOM_QUERY.format(filters, per_page)
     logging.info(f"Query: {query}")
     response = requests.post(
         url=GRAPHQL_ENDPOINT,
@@ -363,33 +421,34 @@ def query_training_data(per_page=500, limited=True):
 
 
 DEBUG_SOM_QUERY = """
-{{
-  all_books (filters: {0}) {{
-    edges {{
-      node {{
-        book_id,
-        title,
-        author,
-        summary,
-      }}
-    }}
-  }}
-}}""".strip()
+query debug_som($shas: [String]!) {
+  books_by_sha (shas: $shas) {
+    book_id,
+    title,
+    author,
+    summary,
+  }
+}""".strip()
 
 
 def query_debug_display(sha_list):
     logging.info("Getting data ...")
-    query = DEBUG_SOM_QUERY.format(
-        "{{sha_in: {0}, summary_exists: true}}".format(json.dumps(sha_list))
-    )
-    logging.info(f"Query: {query}")
-    response = requests.post(
-        url=GRAPHQL_ENDPOINT,
-        json={"query": query},
-    ).json()
-    books = response["data"]["all_books"]["edges"]
+    books = []
+    # The endpoint takes at most BULK_MAX_SHAS shas per request
+    for start in range(0, len(sha_list), BULK_MAX_SHAS):
+        shas = sha_list[start : start + BULK_MAX_SHAS]
+        logging.info(f"Query: books_by_sha of {len(shas)} shas")
+        response = requests.post(
+            url=GRAPHQL_ENDPOINT,
+            json={"query": DEBUG_SOM_QUERY, "variables": {"shas": shas}},
+        ).json()
+        books.extend(
+            {"node": book}
+            for book in response["data"]["books_by_sha"]
+            if book is not None and book.get("summary")
+        )
     if len(books) == 0:
-        raise Exception(f"No books found for the following query: {query}")
+        raise Exception(f"No books with a summary found for {len(sha_list)} shas")
     return books
 
 
@@ -436,10 +495,10 @@ def get_surface_state(data=None):
     )  # Shape: (num_datasets, num_samples, num_features)
 
     # Reshape codebook for distance computation (flattened SOM grid)
-    codebookReshaped = model_dict["lda_websom"].codebook.reshape(
-        model_dict["lda_websom"].codebook.shape[0]
-        * model_dict["lda_websom"].codebook.shape[1],
-        model_dict["lda_websom"].codebook.shape[2],
+    codebookReshaped = model_registry["lda_websom"].codebook.reshape(
+        model_registry["lda_websom"].codebook.shape[0]
+        * model_registry["lda_websom"].codebook.shape[1],
+        model_registry["lda_websom"].codebook.shape[2],
     )  # Shape: (num_units, num_features)
 
     # Broadcasting for distance computation
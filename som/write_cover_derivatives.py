@@ -0,0 +1,95 @@
+import argparse
+import logging
+import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from app.similarbooks.config import Config
+from spiders.bookspider.bookspider.covers import (
+    cover_hash,
+    derivative_filename,
+    read_manifest,
+    write_cover_derivatives,
+    write_manifest,
+)
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+DERIVATIVES_DIR = Config.COVERS_DIR / "webp"
+MANIFEST_PATH = DERIVATIVES_DIR / "manifest.jsonl"
+
+
+def process_cover(source):
+    sha = source.stem
+    try:
+        return write_cover_derivatives(sha, source, DERIVATIVES_DIR)
+    except OSError as e:
+        logging.error(f"Failed to write the cover derivatives of {sha}: {e}")
+        return None
+
+
+def process_covers(workers, prune):
+    manifest = read_manifest(MANIFEST_PATH) if MANIFEST_PATH.exists() else {}
+    sources = sorted(Config.COVERS_DIR.glob("*.png"))
+
+    # Covers whose content and settings did not change keep their derivatives
+    outdated = [
+        source
+        for source in sources
+        if manifest.get(source.stem, {}).get("hash") != cover_hash(source.read_bytes())
+    ]
+    logging.info(f"{len(outdated)} of {len(sources)} covers need derivatives")
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for entry in tqdm.tqdm(
+            executor.map(process_cover, outdated, chunksize=64), total=len(outdated)
+        ):
+            if entry is not None:
+                manifest[entry["sha"]] = entry
+
+    # Drop the entries of deleted covers and rewrite the manifest compacted
+    shas = {source.stem for source in sources}
+    manifest = {sha: entry for sha, entry in manifest.items() if sha in shas}
+    write_manifest(MANIFEST_PATH, manifest.values())
+    logging.info(f"Wrote {len(manifest)} covers to {MANIFEST_PATH}")
+
+    if prune:
+        referenced = {
+            derivative_filename(entry["sha"], entry["hash"], width)
+            for entry in manifest.values()
+            for width in entry["widths"]
+        }
+        pruned = 0
+        for path in DERIVATIVES_DIR.glob("*.webp"):
+            if path.name not in referenced:
+                path.unlink()
+                pruned += 1
+        logging.info(f"Pruned {pruned} unreferenced derivatives")
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Write the WebP cover derivatives and their manifest.",
+        prog="write_cover_derivatives",
+    )
+    parser.add_argument(
+        "--workers",
+        help="Number of covers converted in parallel.",
+        default=4,
+        type=int,
+    )
+    parser.add_argument(
+        "--prune",
+        help="Delete derivatives that the manifest no longer references. "
+        "Pages cached before still link them until they expire.",
+        action="store_true",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    process_covers(args.workers, args.prune)
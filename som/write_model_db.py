@@ -6,7 +6,7 @@ import numpy as np
 import pandas as pd
 import requests
 import datetime
-from utils import model_dict
+from utils import model_registry
 from app.similarbooks.config import Config
 from app.similarbooks.main.constants import (
     GRAPHQL_ENDPOINT,
@@ -54,4 +54,4 @@ def process_model(som):
 
 
 if __name__ == "__main__":
-    process_model(model_dict["lda_websom"])
+    process_model(model_registry["lda_websom"])
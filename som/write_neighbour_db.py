@@ -0,0 +1,118 @@
+import argparse
+import logging
+import tqdm
+import numpy as np
+import mongoengine as me
+from som.utils import model_registry
+from app.similarbooks.config import Config
+from spiders.bookspider.bookspider.models import Websom
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+def rank_neighbour_cells(som, radius=3, top_n=24):
+    """Rank the cells around each SOM node by codebook distance.
+
+    Candidates are the cells within `radius` grid steps. On a toroid map the
+    window wraps around the edges, on a planar map it is cut off. Equal
+    distances are ranked by the U-matrix value, preferring dense regions.
+
+    :returns: Flat cell indices (row * columns + col) of shape
+              (rows, columns, top_n). Missing planar neighbours are -1.
+    :rtype: 3D numpy.array
+    """
+    codebook = som.codebook
+    n_rows, n_columns, _ = codebook.shape
+    toroid = som._map_type == "toroid"
+    rows, columns = np.indices((n_rows, n_columns))
+
+    offsets = [
+        (row_offset, column_offset)
+        for row_offset in range(-radius, radius + 1)
+        for column_offset in range(-radius, radius + 1)
+        if (row_offset, column_offset) != (0, 0)
+    ]
+    distances = np.empty((n_rows, n_columns, len(offsets)))
+    umatrix_values = np.empty((n_rows, n_columns, len(offsets)))
+    cell_indices = np.empty((n_rows, n_columns, len(offsets)), dtype=int)
+
+    for k, (row_offset, column_offset) in enumerate(offsets):
+        neighbour_rows = rows + row_offset
+        neighbour_columns = columns + column_offset
+        if toroid:
+            neighbour_rows %= n_rows
+            neighbour_columns %= n_columns
+            valid = np.ones((n_rows, n_columns), dtype=bool)
+        else:
+            valid = (
+                (neighbour_rows >= 0)
+                & (neighbour_rows < n_rows)
+                & (neighbour_columns >= 0)
+                & (neighbour_columns < n_columns)
+            )
+            neighbour_rows = neighbour_rows.clip(0, n_rows - 1)
+            neighbour_columns = neighbour_columns.clip(0, n_columns - 1)
+
+        distances[:, :, k] = np.where(
+            valid,
+            np.linalg.norm(
+                codebook - codebook[neighbour_rows, neighbour_columns], axis=2
+            ),
+            np.inf,
+        )
+        umatrix_values[:, :, k] = som.umatrix[neighbour_rows, neighbour_columns]
+        cell_indices[:, :, k] = np.where(
+            valid, neighbour_rows * n_columns + neighbour_columns, -1
+        )
+
+    # Sort by distance first and U-matrix value second
+    order = np.lexsort((umatrix_values, distances))[:, :, :top_n]
+    return np.take_along_axis(cell_indices, order, axis=2)
+
+
+def process_model(som, radius, top_n):
+    logging.info(f"Ranking neighbour cells for {som.name} ...")
+    neighbour_cells = rank_neighbour_cells(som, radius=radius, top_n=top_n)
+    n_rows, n_columns, _ = neighbour_cells.shape
+
+    for row in tqdm.trange(n_rows):
+        for col in range(n_columns):
+            Websom.objects(bmu_col=col, bmu_row=row).update_one(
+                set__cell_index=row * n_columns + col,
+                set__neighbour_cells=[
+                    int(cell_index)
+                    for cell_index in neighbour_cells[row, col]
+                    if cell_index >= 0
+                ],
+            )
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Rank the neighbour cells of each SOM cell by codebook distance.",
+        prog="write_neighbour_db",
+    )
+    parser.add_argument(
+        "--radius",
+        help="Grid radius of the candidate cells around each cell.",
+        default=3,
+        type=int,
+    )
+    parser.add_argument(
+        "--top_n",
+        help="Number of ranked neighbour cells stored per cell.",
+        default=24,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    me.connect(db="similarbooks", host=Config.MONGODB_SETTINGS["host"])
+    process_model(model_registry["lda_websom"], radius=args.radius, top_n=args.top_n)
@@ -0,0 +1,62 @@
+import argparse
+import logging
+import tqdm
+import mongoengine as me
+from app.similarbooks.config import Config
+from app.similarbooks.main.constants import SIMILAR_LIST_SIZE
+from spiders.bookspider.bookspider.models import Websom
+from spiders.bookspider.bookspider.similar import build_similar_list
+
+logging.basicConfig(
+    format="%(asctime)s %(levelname)-8s %(message)s",
+    level=logging.INFO,
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+def update_cell(bmu_col, bmu_row, top_n=SIMILAR_LIST_SIZE):
+    cell = (
+        Websom.objects(bmu_col=bmu_col, bmu_row=bmu_row)
+        .only("matched_list")
+        .as_pymongo()
+        .first()
+    )
+    if cell is None:
+        logging.warning(f"No Websom cell for bmu node ({bmu_col}, {bmu_row})")
+        return
+
+    similar_list = build_similar_list(cell.get("matched_list", []), top_n=top_n)
+    Websom.objects(bmu_col=bmu_col, bmu_row=bmu_row).update_one(
+        set__similar_list=similar_list
+    )
+
+
+def process_model(top_n=SIMILAR_LIST_SIZE):
+    logging.info("Materializing similar lists ...")
+    cells = Websom.objects.only("bmu_col", "bmu_row", "matched_list").as_pymongo()
+    for cell in tqdm.tqdm(cells, total=cells.count()):
+        similar_list = build_similar_list(cell.get("matched_list", []), top_n=top_n)
+        Websom.objects(bmu_col=cell["bmu_col"], bmu_row=cell["bmu_row"]).update_one(
+            set__similar_list=similar_list
+        )
+
+
+def command_line_arguments():
+    """Define and handle command line interface"""
+    parser = argparse.ArgumentParser(
+        description="Materialize the similar books list of each SOM cell.",
+        prog="write_similar_db",
+    )
+    parser.add_argument(
+        "--top_n",
+        help="Number of books kept per cell.",
+        default=SIMILAR_LIST_SIZE,
+        type=int,
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = command_line_arguments()
+    me.connect(db="similarbooks", host=Config.MONGODB_SETTINGS["host"])
+    process_model(top_n=args.top_n)
@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+from app.similarbooks.main.constants import COVER_WIDTHS, COVER_QUALITY
+
+
+def cover_hash(data, widths=COVER_WIDTHS, quality=COVER_QUALITY):
+    """Short hash of the source image and the settings its derivatives are made with."""
+    digest = hashlib.sha1(data)
+    digest.update(f"{widths}:{quality}".encode())
+    return digest.hexdigest()[:12]
+
+
+def derivative_filename(sha, content_hash, width):
+    return f"{sha}.{content_hash}.{width}.webp"
+
+
+def write_cover_derivatives(
+    sha, source, derivatives_dir, widths=COVER_WIDTHS, quality=COVER_QUALITY
+):
+    """Write the WebP thumbnails of a cover and return its manifest entry.
+
+    Covers are never upscaled, a source narrower than a width yields a single
+    derivative of its own width instead.
+    """
+    data = Path(source).read_bytes()
+    content_hash = cover_hash(data, widths, quality)
+    img = Image.open(BytesIO(data))
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+
+    widths = sorted({min(width, img.size[0]) for width in widths})
+    derivatives_dir = Path(derivatives_dir)
+    derivatives_dir.mkdir(parents=True, exist_ok=True)
+    for width in widths:
+        path = derivatives_dir / derivative_filename(sha, content_hash, width)
+        if path.exists():
+            continue
+        height = max(1, round(img.size[1] * width / img.size[0]))
+        thumbnail = img.resize((width, height), Image.LANCZOS)
+        # Rename into place, so the web server never serves a partial file
+        tmp_path = path.with_suffix(".tmp")
+        thumbnail.save(tmp_path, "WEBP", quality=quality, method=6)
+        os.replace(tmp_path, path)
+
+    return {"sha": sha, "hash": content_hash, "widths": widths}
+
+
+def read_manifest(manifest_path):
+    """Return the manifest entries by sha, later lines replace earlier ones."""
+    entries = {}
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A line that is being appended right now
+                continue
+            entries[entry["sha"]] = entry
+    return entries
+
+
+def append_manifest(manifest_path, entries):
+    """Append entries to the manifest, a later line of a sha replaces earlier ones."""
+    lines = "".join(json.dumps(entry) + "\n" for entry in entries)
+    # A single append of a few lines is not interleaved with other writers
+    with open(manifest_path, "a") as manifest:
+        manifest.write(lines)
+
+
+def write_manifest(manifest_path, entries):
+    """Replace the manifest with one line per entry."""
+    manifest_path = Path(manifest_path)
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as manifest:
+        for entry in entries:
+            manifest.write(json.dumps(entry) + "\n")
+    os.replace(tmp_path, manifest_path)
@@ -0,0 +1,73 @@
+import logging
+from pymongo.errors import PyMongoError
+
+# Plan stages of queries that read the whole collection or sort in memory
+SCAN_STAGES = {"COLLSCAN"}
+SORT_STAGES = {"SORT", "SORT_KEY_GENERATOR"}
+
+
+def normalize_keys(keys):
+    """Key list of an index with numeric directions as ints."""
+    return tuple(
+        (field, direction if isinstance(direction, str) else int(direction))
+        for field, direction in keys
+    )
+
+
+def declared_indexes(document):
+    """Return the key lists of the indexes declared in the meta of a document."""
+    return [normalize_keys(spec["fields"]) for spec in document._meta["index_specs"]]
+
+
+def missing_indexes(document):
+    """Return the declared indexes that the live collection does not have."""
+    existing = {
+        normalize_keys(index["key"])
+        for index in document._get_collection().index_information().values()
+    }
+    return [keys for keys in declared_indexes(document) if keys not in existing]
+
+
+def verify_indexes(*documents):
+    """Log the declared indexes missing in the live collections.
+
+    Returns the number of missing indexes and never raises, so a server that
+    is not reachable yet does not keep the app from starting.
+    """
+    missing = 0
+    for document in documents:
+        try:
+            indexes = missing_indexes(document)
+        except PyMongoError as e:
+            logging.error(f"Could not verify the indexes of {document.__name__}: {e}")
+            continue
+        for keys in indexes:
+            logging.warning(f"{document.__name__} is missing the index {list(keys)}")
+        missing += len(indexes)
+    return missing
+
+
+def plan_problems(explain):
+    """Return the collection scans and in-memory sorts of an explain output."""
+    problems = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            stage = node.get("stage")
+            if stage in SCAN_STAGES:
+                problems.add("COLLSCAN")
+            elif stage in SORT_STAGES:
+                problems.add("SORT")
+            for key, value in node.items():
+                # The command echoed by the server is not part of the plan
+                if key not in ("command", "originalCommand"):
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(explain)
+    # A $sort the planner could not push down runs as an aggregation stage
+    if any("$sort" in stage for stage in explain.get("stages", [])):
+        problems.add("SORT")
+    return problems
@@ -0,0 +1,51 @@
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor
+from app.similarbooks.main.constants import (
+    BULK_BATCH_SIZE,
+    BULK_WORKERS,
+    BULK_TIME_LIMIT_MS,
+)
+from .models import Book
+
+# Shared by the lookups of a worker, so concurrent requests queue for the same
+# connections instead of each opening its own
+_executor = ThreadPoolExecutor(max_workers=BULK_WORKERS)
+
+
+def _fetch(shas, projection):
+    return list(
+        Book._get_collection().find(
+            {"sha": {"$in": shas}}, projection, max_time_ms=BULK_TIME_LIMIT_MS
+        )
+    )
+
+
+def books_by_sha(shas, fields=None, exclude=(), batch_size=BULK_BATCH_SIZE):
+    """Return the book rows of shas in their order, None for unknown shas.
+
+    The distinct shas are split into $in queries of at most batch_size on the
+    sha index which run concurrently, so a long list costs about as long as
+    its slowest batch instead of one unbounded query. Only `fields` (all by
+    default) minus `exclude` are read.
+    """
+    distinct = list(dict.fromkeys(sha for sha in shas if sha is not None))
+    batches = [
+        distinct[start : start + batch_size]
+        for start in range(0, len(distinct), batch_size)
+    ]
+
+    if fields is not None:
+        projection = {field: 1 for field in fields if field not in exclude}
+        # Needed to put the rows back in order
+        projection["sha"] = 1
+        projection["_id"] = 0
+    else:
+        projection = {field: 0 for field in {"_id", *exclude}}
+
+    if len(batches) > 1:
+        results = _executor.map(_fetch, batches, repeat(projection))
+    else:
+        results = [_fetch(batch, projection) for batch in batches]
+
+    rows = {row["sha"]: row for result in results for row in result}
+    return [rows.get(sha) for sha in shas]
@@ -22,6 +22,9 @@ class Book(Document):
     credits = StringField()
     language = StringField()
     summary = StringField()
+    # Number of code points of summary, kept in sync by the spider pipeline so
+    # that summary length filters can use an index
+    summary_length = IntField()
     image_url = StringField()
     genres = ListField()
     num_pages = IntField()
@@ -69,6 +72,27 @@ class Book(Document):
     bmu_col = IntField()
     bmu_row = IntField()
 
+    meta = {
+        "indexes": [
+            "sha",
+            "book_id",
+            # The cell and top book pages sort by ratings_count with _id as tie
+            # breaker, which the index serves in both directions
+            {"fields": ["bmu_col", "bmu_row", "-ratings_count", "-id"]},
+            {"fields": ["-ratings_count", "-id"]},
+            "spider",
+            # Equality fields first, the summary length range last. Its prefix
+            # also serves language alone
+            {"fields": ["language", "spider", "summary_length"]},
+            # summary_length_gte filters without a language
+            "summary_length",
+        ],
+        # Building an index on the books collection takes long, so it is left to
+        # som/backfill_summary_length.py and app/check_indexes.py --create
+        # instead of whichever process touches the collection first
+        "auto_create_index": False,
+    }
+
 
 class Websom(Document):
 
@@ -77,12 +101,22 @@ class Websom(Document):
     bmu_row = IntField(required=True)
     matched_list = ListField()
 
+    # Ranked and title deduplicated books of this cell, materialized by
+    # som/write_similar_db.py as dicts of sha, title, author and ratings_count
+    similar_list = ListField()
+
+    # Flat cell index (bmu_row * columns + bmu_col) and the cell indices of the
+    # nearest cells by codebook distance, written by som/write_neighbour_db.py
+    cell_index = IntField()
+    neighbour_cells = ListField(IntField())
+
     meta = {
         "collection": "lda_websom",
         "indexes": [
             {
                 "fields": ["bmu_col", "bmu_row"],
                 "unique": True,  # Ensure that the combination of bmu_col and bmu_row is unique
-            }
+            },
+            "cell_index",
         ],
     }
@@ -15,6 +15,8 @@ from PIL import Image
 from io import BytesIO
 from mongoengine.connection import disconnect
 from bookspider.models import Book, Websom
+from bookspider.covers import write_cover_derivatives, append_manifest
+from app.similarbooks.config import Config
 from app.similarbooks.main.constants import (
     MIN_SUMMARY_LENGTH,
 )
@@ -28,11 +30,21 @@ MONGODB_SETTINGS = {
     "port": 27017,
 }
 
-PARENT_DIR = Path(__file__).resolve().parent
+# The /covers route serves the derivatives from here, see Config.COVERS_DIR
+COVERS_WEBP_DIR = Config.COVERS_DIR / "webp"
+
+
+def add_cover_derivatives(spider, sha, source):
+    """Write the WebP thumbnails of a downloaded cover and add them to the manifest."""
+    try:
+        entry = write_cover_derivatives(sha, source, COVERS_WEBP_DIR)
+        append_manifest(COVERS_WEBP_DIR / "manifest.jsonl", [entry])
+    except OSError as e:
+        spider.logger.error(f"Failed to write the cover derivatives of {sha}: {e}")
 
 
 def download_book_cover(spider, sha, url, retries=3, timeout=10, max_width=200):
-    savedir = PARENT_DIR / Path(f"../../../app/similarbooks/static/covers/{sha}.png")
+    savedir = Config.COVERS_DIR / f"{sha}.png"
 
     if os.path.exists(savedir):
         spider.logger.info(f"Image {sha} already exists!")
@@ -64,6 +76,7 @@ def download_book_cover(spider, sha, url, retries=3, timeout=10, max_width=200):
                 # Save the image locally
                 img.save(savedir, optimize=True, quality=85)
                 spider.logger.info(f"Image {sha} downloaded and saved successfully!")
+                add_cover_derivatives(spider, sha, savedir)
                 time.sleep(1)
                 return True  # Download succeeded, exit the loop
             else:
@@ -132,11 +145,13 @@ class BookspiderMongoDBPipeline:
 
                     setattr(existing_item, key, value)
                 spider.logger.info(f"Book with id {item['book_id']} overridden!")
+                existing_item.summary_length = len(existing_item.summary or "")
                 existing_item.save()
         else:
             image_url = item.get("image_url")
             if image_url:
                 download_book_cover(spider, item["sha"], image_url)
             book = Book(**dict(item))
+            book.summary_length = len(book.summary or "")
             book.save()
         return item
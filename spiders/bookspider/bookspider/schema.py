@@ -1,9 +1,75 @@
+import base64
+import hashlib
+import random
+import logging
+import threading
+from time import time
 import graphene
 from graphene.relay import Node
 from graphene_mongo import MongoengineConnectionField, MongoengineObjectType
+from graphene_mongo.utils import ast_to_dict, collect_query_fields
 from graphene import Connection, PageInfo
-from app.similarbooks.main.constants import QUERY_LIMIT, IGNORE_FIELDS_FOR_FILTER
+from bson import json_util
+from pymongo.errors import ExecutionTimeout
+from app.similarbooks.config import Config
+from app.similarbooks.main.common import cache
+from app.similarbooks.main.constants import (
+    QUERY_LIMIT,
+    IGNORE_FIELDS_FOR_FILTER,
+    RANDOM_BOOKS_COUNT,
+    RANDOM_POOL_SIZE,
+    RANDOM_POOL_REFRESH_SECONDS,
+    RANDOM_POOL_MIN_SUMMARY_LENGTH,
+    RANDOM_POOL_OVERSAMPLING,
+    RANDOM_POOL_FIELDS,
+    COUNT_TIME_LIMIT_MS,
+    FACET_TIME_LIMIT_MS,
+    COUNT_CACHE_TIMEOUT,
+    FACET_FIELDS,
+    FACET_LIMIT,
+    SIMILAR_LIST_SIZE,
+    BULK_MAX_SHAS,
+)
 from .models import Book as BookModel
+from .similar import similar_books
+from .loader import books_by_sha
+from app.similarbooks.main.text_inference import similar_to_text
+
+
+class FacetCount(graphene.ObjectType):
+    value = graphene.String()
+    count = graphene.Int()
+
+
+class BookFacets(graphene.ObjectType):
+    language = graphene.List(FacetCount)
+    spider = graphene.List(FacetCount)
+    genres = graphene.List(FacetCount)
+
+
+class BookConnection(Connection):
+    """Connection of books with optional counts over all pages of its filters."""
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int(
+        name="totalCount",
+        description="Number of books matching the filters, null if counting takes too long",
+    )
+    facets = graphene.Field(
+        BookFacets,
+        description="Most frequent languages, spiders and genres of the books matching the filters",
+    )
+
+    # Set by common_resolver, connections of random_books have no counts
+    match = None
+
+    def resolve_total_count(self, info):
+        return None if self.match is None else count_books(self.match)
+
+    def resolve_facets(self, info):
+        return None if self.match is None else facet_books(self.match)
 
 
 class Book(MongoengineObjectType):
@@ -13,6 +79,27 @@ class Book(MongoengineObjectType):
         description = "Book"
         model = BookModel
         interfaces = (Node,)
+        connection_class = BookConnection
+
+    @classmethod
+    def is_type_of(cls, root, info):
+        # Resolvers on the raw node path return the rows as plain dicts
+        return isinstance(root, dict) or super().is_type_of(root, info)
+
+    def resolve_id(self, info):
+        if isinstance(self, dict):
+            return str(self.get("id"))
+        return super().resolve_id(info)
+
+
+class SimilarBook(graphene.ObjectType):
+    class Meta:
+        description = "Book of the same or a neighbouring SOM cell"
+
+    sha = graphene.String()
+    title = graphene.String()
+    author = graphene.String()
+    ratings_count = graphene.Int()
 
 
 class BookFilter(graphene.InputObjectType):
@@ -198,93 +285,335 @@ ignore_dict = {
 }
 
 
+def get_sort_keys(order_by):
+    """Sort keys of a page, `_id` breaks ties so every row has a unique position."""
+    if order_by is None:
+        return [("_id", 1)]
+    ((field, sort_order),) = get_sort_args(order_by).items()
+    if field == "_id":
+        return [("_id", sort_order)]
+    return [(field, sort_order), ("_id", sort_order)]
+
+
+def encode_cursor(order_by, values):
+    """Opaque cursor holding the sort key values of a row."""
+    return base64.urlsafe_b64encode(
+        json_util.dumps([order_by, values]).encode()
+    ).decode()
+
+
+def decode_cursor(cursor, order_by):
+    try:
+        cursor_order_by, values = json_util.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor {cursor}") from e
+    if cursor_order_by != order_by:
+        raise ValueError(f"The cursor {cursor} was issued for another order_by")
+    return values
+
+
+def keyset_match(sort_keys, values):
+    """Match the rows that sort after the row with the given sort key values."""
+    if len(sort_keys) == 1:
+        ((_, sort_order),) = sort_keys
+        return {"_id": {"$lt" if sort_order == -1 else "$gt": values[0]}}
+
+    (field, sort_order), _ = sort_keys
+    value, _id = values
+    operator = "$lt" if sort_order == -1 else "$gt"
+    conditions = [{field: value, "_id": {operator: _id}}]
+    # Missing values sort lowest, before all values in ascending order and
+    # after them in descending order
+    if value is None:
+        if sort_order == 1:
+            conditions.append({field: {"$ne": None}})
+    else:
+        conditions.append({field: {operator: value}})
+        if sort_order == -1:
+            conditions.append({field: None})
+    return {"$or": conditions}
+
+
+def requested_fields(info, connection=True):
+    """Return the model fields selected below edges.node of a connection,
+    or of the field itself for a list of books. None, so whole documents are
+    read, when GRAPHQL_PROJECT_FIELDS is off."""
+    if not Config.GRAPHQL_PROJECT_FIELDS:
+        return None
+    fragments = {name: ast_to_dict(value) for name, value in info.fragments.items()}
+    query = collect_query_fields(ast_to_dict(info.field_nodes[0]), fragments)
+    node = query.get("edges", {}).get("node", {}) if connection else query
+    return {field for field in node if field in BookModel._fields and field != "id"}
+
+
+def book_match(filters, kwargs=None):
+    """Return the $match of BookFilter filters and the other resolver arguments."""
+    filters = update_filter(filters, kwargs or {})
+
+    # Summary lengths are stored by the pipeline, so the filter is an index range
+    summary_length_filter = filters.pop("summary__length_gte", None)
+    if summary_length_filter is not None:
+        filters["summary_length__gte"] = summary_length_filter
+
+    return convert_filters(filters)
+
+
 def common_resolver(**kwargs):
-    per_page = min(kwargs.get("per_page", QUERY_LIMIT), QUERY_LIMIT)
-    offset = (kwargs.get("page", 1) - 1) * per_page
+    """Resolve a page of books with keyset pagination.
+
+    The page starts after the row encoded in the `after` cursor and is sorted
+    by `order_by` plus `_id`, so a deep page costs the same index range scan
+    as the first one. `page` is ignored. With `raw` the nodes are the row
+    dicts instead of Book instances.
+    """
+    per_page = min(
+        kwargs.get("first") or kwargs.get("per_page", QUERY_LIMIT), QUERY_LIMIT
+    )
     order_by = kwargs.get("order_by", None)
-    filters = update_filter(kwargs.get("filters", {}), kwargs)
+    after = kwargs.get("after", None)
     rapid_api_request = kwargs.get("rapid_api_request", None)
+    sort_keys = get_sort_keys(order_by)
 
-    # Check if the `summary__length_gte` filter is provided
-    summary_length_filter = filters.pop("summary__length_gte", None)
-
+    match = book_match(kwargs.get("filters", {}), kwargs)
     pipeline = [
-        {"$match": convert_filters(filters)},  # Apply other filters
+        {"$match": match},  # Apply other filters
     ]
 
-    # If a summary length filter is provided, apply it
-    if summary_length_filter is not None:
+    if after is not None:
         pipeline.append(
-            {
-                "$match": {
-                    "$and": [
-                        {"summary": {"$exists": True}},  # Check if summary exists
-                        {
-                            "$expr": {
-                                "$gte": [
-                                    {
-                                        "$strLenCP": {
-                                            "$ifNull": [
-                                                "$summary",
-                                                "",
-                                            ]  # Ensure summary is not null
-                                        }
-                                    },
-                                    summary_length_filter,
-                                ]
-                            }
-                        },
-                    ]
-                }
-            }
+            {"$match": keyset_match(sort_keys, decode_cursor(after, order_by))}
         )
 
-    if order_by is not None:
-        pipeline.extend([{"$sort": get_sort_args(order_by)}])
-
     pipeline.extend(
         [
-            # {"$skip": offset},  # Pagination: skip first `offset` documents
-            {"$limit": per_page},  # Limit the number of documents returned
-            {
-                "$project": ({"_id": 0} if rapid_api_request is None else ignore_dict)
-            },  # Don't return the `_id` field
+            {"$sort": dict(sort_keys)},
+            # One more row than requested tells whether a next page exists
+            {"$limit": per_page + 1},
         ]
     )
+    # The sort keys are kept for the cursors and dropped before the transform
+    fields = kwargs.get("fields", None)
+    hidden_fields = {"_id"}
+    if rapid_api_request is not None:
+        hidden_fields.update(ignore_dict)
+    if fields is not None:
+        # Only the selected fields leave Mongo, not whole documents
+        projection = {field: 1 for field in fields if field not in hidden_fields}
+        projection.update((field, 1) for field, _ in sort_keys)
+        pipeline.append({"$project": projection})
+    elif rapid_api_request is not None:
+        pipeline.append(
+            {"$project": {key: 0 for key in ignore_dict if key not in dict(sort_keys)}}
+        )
 
-    return list(
-        map(
-            lambda prop: transform(prop, kwargs.get("document")),
-            BookModel.objects.aggregate(*pipeline),
+    rows = list(BookModel.objects.aggregate(*pipeline))
+    has_next_page = len(rows) > per_page
+    rows = rows[:per_page]
+
+    document = kwargs.get("document")
+    raw = kwargs.get("raw", False)
+    connection_type = document._meta.connection
+    edges = []
+    for row in rows:
+        cursor = encode_cursor(order_by, [row.get(field) for field, _ in sort_keys])
+        node = {
+            key: value
+            for key, value in row.items()
+            if key not in hidden_fields and (fields is None or key in fields)
+        }
+        edges.append(
+            connection_type.Edge(
+                node=node if raw else transform(node, document), cursor=cursor
+            )
         )
+
+    connection = connection_type(
+        edges=edges,
+        page_info=PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=after is not None,
+            has_next_page=has_next_page,
+        ),
+    )
+    # Counted only if totalCount or facets are selected
+    connection.match = match
+    return connection
+
+
+def cached_count(prefix, match, count):
+    """Return count(match), cached per normalized filter.
+
+    A count that hits its time limit is cached as None as well, so a slow
+    filter is not counted again on every request.
+    """
+    normalized = json_util.dumps(match, sort_keys=True)
+    key = f"{prefix}:{hashlib.sha1(normalized.encode('utf-8')).hexdigest()}"
+    entry = cache.get(key)
+    if entry is None:
+        try:
+            value = count(match)
+        except ExecutionTimeout:
+            logging.warning(f"Counting {prefix} of {normalized} timed out")
+            value = None
+        entry = {"value": value}
+        cache.set(key, entry, timeout=COUNT_CACHE_TIMEOUT)
+    return entry["value"]
+
+
+def count_books(match):
+    collection = BookModel._get_collection()
+    if not match:
+        # Read from the collection metadata instead of counting
+        return collection.estimated_document_count()
+    return cached_count(
+        "count",
+        match,
+        lambda match: collection.count_documents(match, maxTimeMS=COUNT_TIME_LIMIT_MS),
     )
 
 
+def facet_pipeline(field):
+    # Books list several genres, each of them is counted
+    unwind = [{"$unwind": f"${field}"}] if field == "genres" else []
+    return unwind + [
+        {"$group": {"_id": f"${field}", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {"$limit": FACET_LIMIT},
+    ]
+
+
+def facet_books(match):
+    def count(match):
+        (facets,) = BookModel._get_collection().aggregate(
+            [
+                {"$match": match},
+                {"$facet": {field: facet_pipeline(field) for field in FACET_FIELDS}},
+            ],
+            maxTimeMS=FACET_TIME_LIMIT_MS,
+        )
+        return {
+            field: [{"value": row["_id"], "count": row["count"]} for row in rows]
+            for field, rows in facets.items()
+        }
+
+    return cached_count("facets", match, count)
+
+
+class RandomBookPool:
+    """In-memory pool of eligible books that random_books draws from.
+
+    The pool is filled in a background thread on first use and refreshed once
+    it is older than `refresh_seconds`, so drawing never waits for a load.
+    Until the first load succeeds books are drawn with a small $sample. The
+    pool only holds the fields in `fields`.
+    """
+
+    def __init__(
+        self,
+        size=RANDOM_POOL_SIZE,
+        refresh_seconds=RANDOM_POOL_REFRESH_SECONDS,
+        min_summary_length=RANDOM_POOL_MIN_SUMMARY_LENGTH,
+        oversampling=RANDOM_POOL_OVERSAMPLING,
+        fields=RANDOM_POOL_FIELDS,
+        quality_filter=None,
+    ):
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self.min_summary_length = min_summary_length
+        self.oversampling = oversampling
+        self.fields = fields
+        self.quality_filter = quality_filter or {
+            "title": {"$nin": [None, ""]},
+            "image_url": {"$nin": [None, ""]},
+        }
+        self._books = []
+        self._loaded_at = 0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def pipeline(self, size):
+        # $sample only reads random documents as the first stage, so more are
+        # drawn than needed and the ineligible ones filtered out afterwards
+        return [
+            {"$sample": {"size": size * self.oversampling}},
+            {
+                "$match": {
+                    **self.quality_filter,
+                    "summary_length": {"$gte": self.min_summary_length},
+                }
+            },
+            {"$limit": size},
+            {"$project": {"_id": 0, **{field: 1 for field in self.fields}}},
+        ]
+
+    def load(self):
+        books = list(BookModel.objects.aggregate(*self.pipeline(self.size)))
+        with self._lock:
+            self._books = books
+            self._loaded_at = time()
+            self._refreshing = False
+        logging.info(f"Loaded {len(books)} books into the random book pool")
+
+    def _refresh(self):
+        try:
+            self.load()
+        except Exception as e:
+            logging.error(f"Refreshing the random book pool failed: {e}")
+            with self._lock:
+                # Retried after refresh_seconds instead of on the next request
+                self._loaded_at = time()
+                self._refreshing = False
+
+    def sample(self, k):
+        with self._lock:
+            refresh = (
+                not self._refreshing and time() - self._loaded_at > self.refresh_seconds
+            )
+            if refresh:
+                self._refreshing = True
+        if refresh:
+            threading.Thread(target=self._refresh, daemon=True).start()
+
+        books = self._books
+        if not books:
+            # Empty until the first load finished or when no book qualifies
+            return list(BookModel.objects.aggregate(*self.pipeline(k)))
+        return random.sample(books, min(k, len(books)))
+
+
+random_book_pool = RandomBookPool()
+
+
 def random_resolver(**kwargs):
     order_by = kwargs.get("order_by", None)
     rapid_api_request = kwargs.get("rapid_api_request", None)
 
-    pipeline = [
-        {"$sample": {"size": 10}},
-    ]
+    books = random_book_pool.sample(RANDOM_BOOKS_COUNT)
 
     if order_by is not None:
-        pipeline.extend([{"$sort": get_sort_args(order_by)}])
+        ((field, sort_order),) = get_sort_args(order_by).items()
+        # Missing values sort lowest like in Mongo
+        books.sort(
+            key=lambda book: (book.get(field) is not None, book.get(field)),
+            reverse=sort_order == -1,
+        )
 
-    pipeline.extend(
-        [
+    fields = kwargs.get("fields", None)
+    if rapid_api_request is not None or fields is not None:
+        books = [
             {
-                "$project": ({"_id": 0} if rapid_api_request is None else ignore_dict)
-            },  # Don't return the `_id` field
+                key: value
+                for key, value in book.items()
+                if (rapid_api_request is None or key not in ignore_dict)
+                and (fields is None or key in fields)
+            }
+            for book in books
         ]
-    )
 
-    return list(
-        map(
-            lambda prop: transform(prop, kwargs.get("document")),
-            BookModel.objects.aggregate(*pipeline),
-        )
-    )
+    if kwargs.get("raw", False):
+        return books
+    return [transform(book, kwargs.get("document")) for book in books]
 
 
 class Query(graphene.ObjectType):
@@ -308,6 +637,8 @@ class Query(graphene.ObjectType):
             model=BookModel,
             document=Book,
             rapid_api_request=rapid_api_request,
+            fields=requested_fields(info),
+            raw=Config.GRAPHQL_RAW_NODES,
             **kwargs,
         )
 
@@ -324,5 +655,63 @@ class Query(graphene.ObjectType):
             model=BookModel,
             document=Book,
             rapid_api_request=rapid_api_request,
+            fields=requested_fields(info),
+            raw=Config.GRAPHQL_RAW_NODES,
             **kwargs,
         )
+
+    books_by_sha = graphene.List(
+        Book,
+        shas=graphene.List(graphene.String, required=True),
+        description=f"Books of the shas in their order, null for unknown shas. "
+        f"Takes at most {BULK_MAX_SHAS} shas",
+    )
+
+    def resolve_books_by_sha(self, info, shas):
+        if len(shas) > BULK_MAX_SHAS:
+            raise ValueError(f"At most {BULK_MAX_SHAS} shas are looked up at once")
+        rapid_api_request = info.context["request"].headers.get(
+            "X-Rapidapi-Request-Id", None
+        )
+        books = books_by_sha(
+            shas,
+            fields=requested_fields(info, connection=False),
+            exclude=ignore_dict if rapid_api_request is not None else (),
+        )
+        if Config.GRAPHQL_RAW_NODES:
+            return books
+        return [book if book is None else transform(book, Book) for book in books]
+
+    similar_books = graphene.List(
+        SimilarBook,
+        sha=graphene.String(required=True),
+        k=graphene.Int(default_value=SIMILAR_LIST_SIZE),
+        distinct_titles=graphene.Boolean(default_value=True),
+        description="Books similar to the book with the sha, ranked by SOM cell "
+        "distance and ratings_count",
+    )
+
+    def resolve_similar_books(self, info, sha, k, distinct_titles):
+        if k < 1:
+            return []
+        # The same materialized cell lists the book pages are rendered from
+        return similar_books(
+            sha, k=min(k, SIMILAR_LIST_SIZE), distinct_titles=distinct_titles
+        )
+
+    similar_to_text = graphene.List(
+        SimilarBook,
+        text=graphene.String(required=True),
+        k=graphene.Int(default_value=SIMILAR_LIST_SIZE),
+        description="Books of the SOM cell the topics of the text map to and of "
+        "its neighbour cells",
+    )
+
+    def resolve_similar_to_text(self, info, text, k):
+        if k < 1:
+            return []
+        # Raises InferenceTimeout, reported as the error of the field
+        return similar_to_text(text, k=min(k, SIMILAR_LIST_SIZE))
+
+
+schema = graphene.Schema(query=Query, types=[Book], auto_camelcase=False)
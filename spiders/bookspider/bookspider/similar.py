@@ -0,0 +1,134 @@
+from app.similarbooks.main.constants import SIMILAR_LIST_SIZE
+from .models import Book, Websom
+from .loader import books_by_sha
+
+
+def build_similar_list(shas, top_n=SIMILAR_LIST_SIZE, distinct_titles=True):
+    """Rank the books of a cell by ratings_count, by default one book per title."""
+    books = [
+        book
+        for book in books_by_sha(
+            list(dict.fromkeys(shas)), fields=("title", "author", "ratings_count")
+        )
+        if book is not None and book.get("title") is not None
+    ]
+    # Missing counts sort lowest like in Mongo
+    books.sort(
+        key=lambda book: (
+            book.get("ratings_count") is not None,
+            book.get("ratings_count"),
+        ),
+        reverse=True,
+    )
+
+    similar_list = []
+    titles = set()
+    for book in books:
+        # Sorted by ratings_count, so the first book of a title is the most rated
+        title = book["title"].strip()
+        if distinct_titles and title in titles:
+            continue
+        titles.add(title)
+        similar_list.append(
+            {
+                "sha": book.get("sha"),
+                "title": title,
+                "author": book.get("author"),
+                "ratings_count": book.get("ratings_count"),
+            }
+        )
+        if len(similar_list) == top_n:
+            break
+    return similar_list
+
+
+def similar_books(sha, k=SIMILAR_LIST_SIZE, distinct_titles=True):
+    """Return up to k books similar to the book with the given sha.
+
+    Starts with the book's own SOM cell and walks the neighbour cells ranked by
+    som/write_neighbour_db.py until k distinct titles are collected. The
+    neighbour cells are fetched with a single $in query on cell_index.
+    Without distinct_titles other editions of a title are kept, the own cell
+    is then ranked on the fly as its materialized list holds one per title.
+    """
+    book = (
+        Book.objects(sha=sha)
+        .only("sha", "title", "bmu_col", "bmu_row")
+        .as_pymongo()
+        .first()
+    )
+    if book is None:
+        return []
+    return book_similar_books(book, k=k, distinct_titles=distinct_titles)
+
+
+def book_similar_books(book, k=SIMILAR_LIST_SIZE, distinct_titles=True):
+    """similar_books of a book already at hand as a dict with sha, title,
+    bmu_col and bmu_row."""
+    if book.get("bmu_col") is None:
+        return []
+
+    return cell_similar_books(
+        book["bmu_col"],
+        book["bmu_row"],
+        k=k,
+        distinct_titles=distinct_titles,
+        exclude_sha=book.get("sha"),
+        exclude_title=(book.get("title") or "").strip(),
+    )
+
+
+def cell_similar_books(
+    bmu_col,
+    bmu_row,
+    k=SIMILAR_LIST_SIZE,
+    distinct_titles=True,
+    exclude_sha=None,
+    exclude_title=None,
+):
+    """Return up to k books of a SOM cell and its neighbour cells, see similar_books."""
+    cell = (
+        Websom.objects(bmu_col=bmu_col, bmu_row=bmu_row)
+        .only("matched_list", "similar_list", "neighbour_cells")
+        .as_pymongo()
+        .first()
+    )
+    if cell is None:
+        return []
+
+    # Cells not materialized yet are ranked on the fly. Websoms saved through
+    # mongoengine store an empty similar_list until write_similar_db.py ran
+    own_list = cell.get("similar_list") if distinct_titles else None
+    if not own_list:
+        own_list = build_similar_list(
+            cell.get("matched_list", []),
+            top_n=SIMILAR_LIST_SIZE if distinct_titles else k + 1,
+            distinct_titles=distinct_titles,
+        )
+    candidate_lists = [own_list]
+
+    neighbour_cells = cell.get("neighbour_cells", [])
+    if neighbour_cells and len(own_list) <= k:
+        neighbours = {
+            neighbour["cell_index"]: neighbour.get("similar_list", [])
+            for neighbour in Websom.objects(cell_index__in=neighbour_cells)
+            .only("cell_index", "similar_list")
+            .as_pymongo()
+        }
+        candidate_lists.extend(
+            neighbours.get(cell_index, []) for cell_index in neighbour_cells
+        )
+
+    books = []
+    titles = {exclude_title} if exclude_title is not None else set()
+    for candidate_list in candidate_lists:
+        for candidate in candidate_list:
+            if candidate["sha"] == exclude_sha or (
+                distinct_titles and candidate["title"] in titles
+            ):
+                continue
+            titles.add(candidate["title"])
+            books.append(candidate)
+            if len(books) == k:
+                return books
+    return books